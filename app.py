@@ -1,15 +1,24 @@
-from flask import Flask, request, jsonify, render_template, send_from_directory, redirect, url_for, session
+from flask import Flask, request, jsonify, render_template, send_from_directory, redirect, url_for, session, Response, stream_with_context, g
+import json
 import logging
 import os
+import uuid
 import shutil
 from werkzeug.utils import secure_filename
 from dotenv import load_dotenv
 
-from main import index_documents, query_rag
-from utils.config import DOCUMENTS_DIR
+from main import index_documents, query_rag, query_rag_stream, query_rag_batch
+from utils.config import DOCUMENTS_DIR, QUERY_BATCH_MAX_QUERIES, QUERY_BATCH_CONCURRENCY
 from utils.auth import auth_bp
 from utils.delete_file_api import bp as delete_file_bp
 from utils.user_files_api import bp as user_files_bp
+from utils.embedding_cache import user_embedding_cache
+from utils.text_embedding_cache import get_text_embedding_cache
+from utils.ingestion_jobs import IngestionQueue, create_job_store
+from utils.services import get_services
+from utils.answer_cache import answer_cache
+from utils.blob_store import get_blob_store
+from utils import metrics
 
 load_dotenv()
 
@@ -27,12 +36,65 @@ os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 os.makedirs(OUTPUTS_FOLDER, exist_ok=True)
 os.makedirs(DOCUMENTS_DIR, exist_ok=True)
 
+ingestion_queue = IngestionQueue(create_job_store())
+
+try:
+    get_services().embedding_store.ensure_indexes()
+    get_services().manifest.ensure_indexes()
+    get_services().chat_history.store.ensure_indexes()
+except Exception:
+    logging.exception('Could not ensure MongoDB indexes at startup')
+
+
+
+def _conversation(data=None):
+    """(user_id, conversation_id); the cookie carries only the id, history lives in the chat history store."""
+    conversation_id = data.get("conversation_id") if isinstance(data, dict) else None
+    if not conversation_id:
+        conversation_id = session.get('conversation_id')
+        if not conversation_id:
+            conversation_id = session['conversation_id'] = uuid.uuid4().hex
+    # Sessions from before the server-side store carried the whole history
+    session.pop('chat_history', None)
+    return session.get('user_id', 'anonymous'), conversation_id
+
+
+@app.before_request
+def start_request_timing():
+    if request.endpoint not in ("static", "metrics_endpoint"):
+        g.trace = metrics.start_trace(f"{request.method} {request.path}")
+
+
+@app.after_request
+def finish_request_timing(response):
+    trace = g.pop("trace", None)
+    if trace is not None:
+        endpoint = request.url_rule.rule if request.url_rule else "unmatched"
+        status = response.status_code
+        # Logged on close so streamed responses are timed to their last byte
+        response.call_on_close(lambda: logging.info("timing %s", metrics.end_trace(trace, endpoint, status)))
+    return response
+
+
+@app.get("/metrics")
+def metrics_endpoint():
+    return Response(metrics.registry.render(), mimetype="text/plain; version=0.0.4")
+
 
 @app.get("/health")
 def health_check():
     return jsonify({"status": "ok"}), 200
 
 
+@app.get("/cache/stats")
+def cache_stats():
+    return jsonify({
+        "embedding_cache": user_embedding_cache.stats(),
+        "text_embedding_cache": get_text_embedding_cache().stats(),
+        "answer_cache": answer_cache.stats(),
+    }), 200
+
+
 @app.get("/")
 def index_page():
     return render_template('landing.html')
@@ -61,28 +123,39 @@ def upload_files():
 
     files = request.files.getlist('files')
     saved = []
+    content_hashes = {}
+    user_id = session.get('user_id', 'anonymous')
+    blob_store = get_blob_store()
     try:
         for f in files:
             if f.filename == '':
                 continue
             filename = secure_filename(f.filename)
-            upload_path = os.path.join(UPLOAD_FOLDER, filename)
-            f.save(upload_path)
-            doc_dest = os.path.join(os.path.abspath(DOCUMENTS_DIR), filename)
-            shutil.copy2(upload_path, doc_dest)
+            # One streamed write, hashed on the way; identical content is stored once
+            content_hashes[filename], _ = blob_store.store(user_id, filename, f.stream)
             saved.append(filename)
 
-        index_documents(DOCUMENTS_DIR)
+        job_id = ingestion_queue.submit(index_documents, blob_store.user_dir(user_id), user_id, saved,
+                                        content_hashes=content_hashes)
 
-        return jsonify({'message': f'Uploaded and indexed {len(saved)} file(s)', 'files': saved}), 200
+        return jsonify({'message': f'Uploaded {len(saved)} file(s); indexing started', 'files': saved, 'job_id': job_id}), 202
     except Exception as e:
         logging.exception('Upload failed')
         return jsonify({'error': str(e)}), 500
 
 
+@app.get('/jobs/<job_id>')
+def job_status(job_id):
+    job = ingestion_queue.store.get(job_id)
+    if not job or job['user_id'] != session.get('user_id', 'anonymous'):
+        return jsonify({'error': 'job not found'}), 404
+    return jsonify(job), 200
+
+
 @app.post('/clear_storage')
 def clear_storage():
     try:
+        get_blob_store().clear_user(session.get('user_id', 'anonymous'))
         for folder in [UPLOAD_FOLDER, OUTPUTS_FOLDER]:
             for name in os.listdir(folder):
                 path = os.path.join(folder, name)
@@ -99,6 +172,7 @@ def clear_storage():
 @app.post('/clear_context')
 def clear_context():
     try:
+        get_blob_store().clear_user(session.get('user_id', 'anonymous'))
         for folder in [UPLOAD_FOLDER, OUTPUTS_FOLDER]:
             for name in os.listdir(folder):
                 path = os.path.join(folder, name)
@@ -109,6 +183,9 @@ def clear_context():
 
         # Removed chroma_db related code
 
+        # The page clears its chat on load, so start a new conversation too
+        session['conversation_id'] = uuid.uuid4().hex
+
         docs_abs = os.path.abspath(os.path.join(os.getcwd(), DOCUMENTS_DIR))
         if os.path.exists(docs_abs):
             for name in os.listdir(docs_abs):
@@ -148,37 +225,110 @@ def query_route():
         return jsonify({"status": "error", "message": "Missing 'query' in JSON body."}), 400
 
     # --- Chat history tracking ---
-    chat_history = session.get('chat_history', [])
-    # Add the new user message to history
-    chat_history.append({"role": "user", "content": query})
+    user_id, conversation_id = _conversation(data)
+    history = get_services().chat_history
 
     try:
+        chat_history = history.get(user_id, conversation_id)
+        # Add the new user message to history
+        chat_history.append({"role": "user", "content": query})
         logging.info(f"Received query: {query}")
-        answer = query_rag(query, chat_history=chat_history)
-        # Add assistant response to history
-        chat_history.append({"role": "assistant", "content": str(answer)})
-        # Store back in session
-        session['chat_history'] = chat_history[-20:]  # keep last 20 turns
-        return jsonify({"status": "success", "query": query, "answer": str(answer)}), 200
+        answer = query_rag(query, chat_history=chat_history, user_id=user_id)
+        history.add_exchange(user_id, conversation_id, query, str(answer))
+        return jsonify({"status": "success", "query": query, "answer": str(answer),
+                        "conversation_id": conversation_id}), 200
     except Exception as e:
         logging.exception("Query failed")
         return jsonify({"status": "error", "message": str(e)}), 500
 
 
+def _sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@app.post("/query/stream")
+def query_stream_route():
+    data = request.get_json(silent=True) or {}
+    query = data.get("query") if isinstance(data, dict) else None
+    if not query:
+        return jsonify({"status": "error", "message": "Missing 'query' in JSON body."}), 400
+
+    user_id, conversation_id = _conversation(data)
+    history = get_services().chat_history
+    logging.info(f"Received streaming query: {query}")
+    trace = g.get("trace")
+
+    def generate():
+        try:
+            # The body is generated after the view returns, so re-activate the request's trace
+            with metrics.use_trace(trace):
+                chat_history = history.get(user_id, conversation_id)
+                chat_history.append({"role": "user", "content": query})
+                for event, payload in query_rag_stream(query, user_id, chat_history=chat_history):
+                    if event == "done":
+                        history.add_exchange(user_id, conversation_id, query, payload)
+                    yield _sse(event, payload)
+        except Exception as e:
+            logging.exception("Streaming query failed")
+            yield _sse("error", str(e))
+
+    return Response(stream_with_context(generate()), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+@app.post("/query/batch")
+def query_batch_route():
+    """
+    Answers a list of independent questions; results are streamed as
+    server-sent "result" events as each answer completes, then a "done" event.
+    """
+    data = request.get_json(silent=True) or {}
+    queries = data.get("queries") if isinstance(data, dict) else None
+    if not isinstance(queries, list) or not queries or not all(isinstance(q, str) and q.strip() for q in queries):
+        return jsonify({"status": "error", "message": "'queries' must be a non-empty list of strings."}), 400
+    if len(queries) > QUERY_BATCH_MAX_QUERIES:
+        return jsonify({"status": "error",
+                        "message": f"At most {QUERY_BATCH_MAX_QUERIES} queries per batch."}), 400
+    try:
+        concurrency = min(int(data.get("concurrency", QUERY_BATCH_CONCURRENCY)), QUERY_BATCH_CONCURRENCY)
+    except (TypeError, ValueError):
+        return jsonify({"status": "error", "message": "'concurrency' must be an integer."}), 400
+
+    user_id = session.get('user_id', 'anonymous')
+    logging.info(f"Received batch of {len(queries)} queries")
+    trace = g.get("trace")
+
+    def generate():
+        answered = 0
+        try:
+            with metrics.use_trace(trace):
+                for result in query_rag_batch(queries, user_id, max_concurrency=concurrency):
+                    answered += 1
+                    yield _sse("result", result)
+            yield _sse("done", {"answered": answered})
+        except Exception as e:
+            logging.exception("Batch query failed")
+            yield _sse("error", str(e))
+
+    return Response(stream_with_context(generate()), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
 @app.get('/uploads/<path:filename>')
 def uploaded_file(filename):
-    return send_from_directory(UPLOAD_FOLDER, filename)
+    return send_from_directory(get_blob_store().user_dir(session.get('user_id', 'anonymous')), filename)
 
 
 @app.get('/preview/<path:filename>')
 def preview_file(filename):
     safe = secure_filename(filename)
     out_path = os.path.join(OUTPUTS_FOLDER, safe)
-    up_path = os.path.join(UPLOAD_FOLDER, safe)
+    user_folder = get_blob_store().user_dir(session.get('user_id', 'anonymous'))
+    up_path = os.path.join(user_folder, safe)
     if os.path.exists(out_path):
         return redirect(url_for('static', filename=f'outputs/{safe}'))
     if os.path.exists(up_path):
-        return send_from_directory(UPLOAD_FOLDER, safe)
+        return send_from_directory(user_folder, safe)
     return jsonify({'error': 'file not found'}), 404
 
 
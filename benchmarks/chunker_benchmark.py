@@ -0,0 +1,188 @@
+"""Golden-output check and micro-benchmark for TextChunker's splitter.
+
+Usage: python -m benchmarks.chunker_benchmark [--sizes 100000 1000000] [--repeat 3]
+
+First verifies that TextChunker._recursive_split produces exactly the same
+chunks as the previous splitter (legacy_split, which re-scanned every
+oversized piece from the paragraph level down) over a generated golden
+corpus, then times both on large synthetic texts and on page-sized
+paragraphs without blank lines, which is what iter_chunks hands the
+splitter for most PDFs.
+"""
+import argparse
+import random
+import re
+import string
+import sys
+import time
+from benchmarks.offline import install
+
+install()
+from utils.text_chunker import TextChunker
+
+
+def _word(rng):
+    if rng.random() < 0.002:
+        return "".join(rng.choices(string.ascii_letters, k=rng.randint(300, 1200)))  # oversized token
+    return "".join(rng.choices(string.ascii_lowercase, k=rng.randint(1, 12)))
+
+
+def _sentence(rng):
+    words = " ".join(_word(rng) for _ in range(rng.randint(1, 40)))
+    return words + rng.choice([".", "!", "?", "", ","])
+
+
+def _line(rng):
+    spacer = rng.choice([" ", "  ", "\t", "  "])
+    return spacer.join(_sentence(rng) for _ in range(rng.randint(1, 8)))
+
+
+def _paragraph(rng):
+    return rng.choice(["\n", "\n", " \n", "\r\n"]).join(_line(rng) for _ in range(rng.randint(1, 10)))
+
+
+def synthetic_text(size: int, seed: int = 0) -> str:
+    rng = random.Random(seed)
+    parts, length = [], 0
+    while length < size:
+        para = _paragraph(rng)
+        parts.append(para)
+        parts.append(rng.choice(["\n\n", "\n\n\n", "\n  \n", "\n \t\n\n"]))
+        length += len(para) + 2
+    text = "".join(parts)[:size]
+    return rng.choice(["", "  ", "\n"]) + text
+
+
+def legacy_split(text, max_size):
+    """The splitter TextChunker._recursive_split replaced, kept as the golden reference."""
+    if len(text) <= max_size:
+        return [text]
+    # Try paragraphs
+    paras = [p.strip() for p in re.split(r"\n\s*\n", text) if p.strip()]
+    if len(paras) > 1:
+        chunks = []
+        buf = ""
+        for para in paras:
+            if len(buf) + len(para) + 2 <= max_size:
+                buf = buf + ("\n\n" if buf else "") + para
+            else:
+                if buf:
+                    chunks.extend(legacy_split(buf, max_size))
+                buf = para
+        if buf:
+            chunks.extend(legacy_split(buf, max_size))
+        return chunks
+    # Try lines
+    lines = [l.strip() for l in text.split("\n") if l.strip()]
+    if len(lines) > 1:
+        chunks = []
+        buf = ""
+        for line in lines:
+            if len(buf) + len(line) + 1 <= max_size:
+                buf = buf + ("\n" if buf else "") + line
+            else:
+                if buf:
+                    chunks.extend(legacy_split(buf, max_size))
+                buf = line
+        if buf:
+            chunks.extend(legacy_split(buf, max_size))
+        return chunks
+    # Try sentences
+    sents = [s.strip() for s in re.split(r'(?<=[.!?])\s+', text) if s.strip()]
+    if len(sents) > 1:
+        chunks = []
+        buf = ""
+        for sent in sents:
+            if len(buf) + len(sent) + 1 <= max_size:
+                buf = buf + (" " if buf else "") + sent
+            else:
+                if buf:
+                    chunks.extend(legacy_split(buf, max_size))
+                buf = sent
+        if buf:
+            chunks.extend(legacy_split(buf, max_size))
+        return chunks
+    # Finally, split by spaces if still too large
+    words = text.split()
+    chunks = []
+    buf = ""
+    for word in words:
+        if len(buf) + len(word) + 1 <= max_size:
+            buf = buf + (" " if buf else "") + word
+        else:
+            if buf:
+                chunks.append(buf)
+            buf = word
+    if buf:
+        chunks.append(buf)
+    return chunks
+
+
+def synthetic_pages(size: int, count: int = 300, seed: int = 0):
+    """Page-sized texts with line breaks but no blank lines."""
+    rng = random.Random(seed)
+    pages = []
+    for _ in range(count):
+        lines, length = [], 0
+        while length < size:
+            lines.append(_line(rng))
+            length += len(lines[-1]) + 1
+        pages.append("\n".join(lines)[:size])
+    return pages
+
+
+def golden_check(cases: int = 300) -> int:
+    """Returns the number of mismatching cases (0 means identical output)."""
+    mismatches = 0
+    rng = random.Random(1234)
+    for case in range(cases):
+        text = synthetic_text(rng.randint(0, 20000), seed=case)
+        max_size = rng.choice([50, 120, 300, 500, 800, 2000])
+        chunker = TextChunker(max_size, 0, embedder=object())
+        if chunker._recursive_split(text, max_size) != legacy_split(text, max_size):
+            mismatches += 1
+            print(f"Mismatch: case={case} len={len(text)} max_size={max_size}")
+    return mismatches
+
+
+def _time(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100_000, 1_000_000, 5_000_000])
+    parser.add_argument("--page-sizes", type=int, nargs="+", default=[1000, 3000, 10000])
+    parser.add_argument("--chunk-size", type=int, default=800)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--golden-cases", type=int, default=300)
+    args = parser.parse_args(argv)
+
+    mismatches = golden_check(args.golden_cases)
+    print(f"Golden corpus: {args.golden_cases} cases, {mismatches} mismatch(es)")
+
+    chunker = TextChunker(args.chunk_size, 0, embedder=object())
+    print(f"{'chars':>10} {'legacy s':>10} {'current s':>10} {'speedup':>8}")
+    for size in args.sizes:
+        text = synthetic_text(size, seed=size)
+        legacy = _time(lambda: legacy_split(text, args.chunk_size), args.repeat)
+        current = _time(lambda: chunker._recursive_split(text, args.chunk_size), args.repeat)
+        print(f"{size:>10} {legacy:>10.4f} {current:>10.4f} {legacy / current:>7.2f}x")
+
+    print(f"{'page chars':>10} {'legacy us':>10} {'current us':>10} {'speedup':>8}")
+    for size in args.page_sizes:
+        pages = synthetic_pages(size, seed=size)
+        legacy = _time(lambda: [legacy_split(page, args.chunk_size) for page in pages], args.repeat)
+        current = _time(lambda: [chunker._recursive_split(page, args.chunk_size) for page in pages], args.repeat)
+        print(f"{size:>10} {legacy / len(pages) * 1e6:>10.1f} {current / len(pages) * 1e6:>10.1f} "
+              f"{legacy / current:>7.2f}x")
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
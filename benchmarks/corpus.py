@@ -0,0 +1,67 @@
+"""Deterministic synthetic corpora for the benchmark suite.
+
+Text is drawn from a fixed vocabulary with a Zipf-like word distribution and
+sprinkled with identifiers (e.g. "AB-1234"), so BM25 and the hashed fake
+embeddings see realistic term statistics.
+"""
+import os
+import random
+from typing import List
+
+_SYLLABLES = ["ka", "lo", "mi", "ne", "ru", "sa", "to", "vi", "zen", "dor", "pha", "quil", "tren", "bas", "gol"]
+
+# name -> (documents, characters per document)
+CORPUS_SIZES = {
+    "small": (10, 5_000),
+    "medium": (50, 20_000),
+    "large": (200, 50_000),
+}
+
+
+def vocabulary(size: int = 5000, seed: int = 7) -> List[str]:
+    rng = random.Random(seed)
+    words = set()
+    while len(words) < size:
+        words.add("".join(rng.choices(_SYLLABLES, k=rng.randint(1, 4))))
+    return sorted(words)
+
+
+class CorpusGenerator:
+    """Generates documents and queries from one shared vocabulary."""
+
+    def __init__(self, seed: int = 0, vocab_size: int = 5000):
+        self.rng = random.Random(seed)
+        self.words = vocabulary(vocab_size)
+        # Zipf-like weights: a few very common words, a long tail of rare ones
+        self.weights = [1.0 / (rank + 1) for rank in range(len(self.words))]
+
+    def _sentence(self) -> str:
+        words = self.rng.choices(self.words, weights=self.weights, k=self.rng.randint(6, 24))
+        if self.rng.random() < 0.1:
+            words.insert(self.rng.randrange(len(words)), f"{self.rng.choice('ABCDEFGH')}{self.rng.choice('XYZ')}-{self.rng.randint(100, 9999)}")
+        return " ".join(words).capitalize() + self.rng.choice([".", ".", ".", "?", "!"])
+
+    def _paragraph(self) -> str:
+        return " ".join(self._sentence() for _ in range(self.rng.randint(2, 8)))
+
+    def document(self, chars: int) -> str:
+        paragraphs, length = [], 0
+        while length < chars:
+            paragraph = self._paragraph()
+            paragraphs.append(paragraph)
+            length += len(paragraph) + 2
+        return "\n\n".join(paragraphs)[:chars]
+
+    def query(self) -> str:
+        return " ".join(self.rng.choices(self.words, weights=self.weights, k=self.rng.randint(3, 9))) + "?"
+
+    def write_folder(self, folder: str, documents: int, chars: int) -> List[str]:
+        """Writes `documents` .txt files of about `chars` characters each; returns their paths."""
+        os.makedirs(folder, exist_ok=True)
+        paths = []
+        for i in range(documents):
+            path = os.path.join(folder, f"doc_{i:04d}.txt")
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(self.document(chars))
+            paths.append(path)
+        return paths
@@ -0,0 +1,122 @@
+"""Deterministic stand-ins for the Gemini-backed services.
+
+The fakes replace only the network calls, so batching, caching, prompt
+building, streaming and threading are measured as deployed.
+Latencies are simulated with time.sleep, which releases the GIL just as
+waiting on an HTTP response does.
+"""
+import hashlib
+import time
+import zlib
+from types import SimpleNamespace
+from typing import Iterator, List
+import numpy as np
+from utils.context_packer import ContextPacker
+from utils.embedding_generator import EmbeddingGenerator
+from utils.lexical_index import tokenize
+from utils.rag_engine import RAGEngine
+from utils.text_embedding_cache import TextEmbeddingCache
+
+
+class FakeEmbeddingBackend:
+    """Embeds texts as signed hashed bags of words.
+
+    Texts that share words get similar vectors, so retrieval and MMR behave
+    roughly as they do on real embeddings. `latency` is slept once per batch
+    request.
+    """
+
+    source = "api"
+
+    def __init__(self, dim: int = 768, latency: float = 0.0, batch_size: int = 100, max_workers: int = 4,
+                 model_name: str = "fake-embedding"):
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.max_workers = max_workers
+        self.dim = dim
+        self.latency = latency
+        self.requests = 0
+
+    def embed_text(self, text: str) -> List[float]:
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for token in tokenize(text):
+            h = zlib.crc32(token.encode("utf-8"))
+            vector[h % self.dim] += 1.0 if h & 0x80000000 else -1.0
+        if not vector.any():
+            # Token-free text still gets a stable, non-zero vector
+            seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:4], "little")
+            vector = np.random.default_rng(seed).standard_normal(self.dim).astype(np.float32)
+        vector /= np.linalg.norm(vector)
+        return vector.tolist()
+
+    def embed(self, batch: List[str]) -> List[List[float]]:
+        self.requests += 1
+        if self.latency:
+            time.sleep(self.latency)
+        return [self.embed_text(text) for text in batch]
+
+
+class FakeEmbeddingGenerator(EmbeddingGenerator):
+    """The real EmbeddingGenerator over a FakeEmbeddingBackend.
+
+    Without a `cache`, a private in-memory SQLite cache is used.
+    """
+
+    def __init__(self, dim: int = 768, latency: float = 0.0, cache=None, batch_size: int = 100,
+                 max_workers: int = 4, model_name: str = "fake-embedding"):
+        super().__init__(
+            backend=FakeEmbeddingBackend(dim, latency, batch_size, max_workers, model_name),
+            cache=cache if cache is not None else TextEmbeddingCache(":memory:"),
+            max_retries=0,
+        )
+
+
+class FakeGenerativeModel:
+    """Stands in for genai.GenerativeModel: echoes the opening words of the prompt's context.
+
+    `latency` is the time to the first token and `token_latency` is slept per
+    word. Responses carry usage_metadata with a rough 4-characters-per-token
+    prompt count.
+    """
+
+    def __init__(self, latency: float = 0.0, token_latency: float = 0.0, answer_words: int = 40):
+        self.latency = latency
+        self.token_latency = token_latency
+        self.answer_words = answer_words
+
+    def _words(self, prompt: str) -> List[str]:
+        context = prompt.split("CONTEXT:", 1)[-1]
+        return context.split()[:self.answer_words]
+
+    @staticmethod
+    def _part(text: str, prompt: str = None, words: int = 0):
+        usage = None
+        if prompt is not None:
+            usage = SimpleNamespace(prompt_token_count=len(prompt) // 4, candidates_token_count=words)
+        return SimpleNamespace(text=text, usage_metadata=usage)
+
+    def generate_content(self, prompt: str, stream: bool = False, request_options=None):
+        if self.latency:
+            time.sleep(self.latency)
+        words = self._words(prompt)
+        if not stream:
+            if self.token_latency:
+                time.sleep(self.token_latency * len(words))
+            return self._part(" ".join(words), prompt, len(words))
+        return self._stream(words, prompt)
+
+    def _stream(self, words: List[str], prompt: str) -> Iterator:
+        for i, word in enumerate(words):
+            if self.token_latency:
+                time.sleep(self.token_latency)
+            last = i == len(words) - 1
+            yield self._part(word if i == 0 else " " + word, prompt if last else None, len(words))
+
+
+class FakeRAGEngine(RAGEngine):
+    """The real RAGEngine (prompt building, streaming, metrics) over FakeGenerativeModel."""
+
+    def __init__(self, latency: float = 0.0, token_latency: float = 0.0, answer_words: int = 40):
+        self.model = FakeGenerativeModel(latency, token_latency, answer_words)
+        self.packer = ContextPacker()
+        self.timeout = None
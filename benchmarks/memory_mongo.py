@@ -0,0 +1,273 @@
+"""In-process stand-in for the subset of the pymongo API this project uses.
+
+Documents are deep-copied on the way in and out, like a real driver encoding
+and decoding BSON, so callers can never alias stored data. Only the query and
+update operators the utils/ modules rely on are implemented; anything else
+raises NotImplementedError rather than silently matching.
+"""
+import copy
+import threading
+import time
+from types import SimpleNamespace
+from typing import Dict, Iterable, List, Optional
+from bson import ObjectId
+
+_MISSING = object()
+
+
+def _get_path(doc: Dict, path: str):
+    value = doc
+    for part in path.split("."):
+        if not isinstance(value, dict) or part not in value:
+            return _MISSING
+        value = value[part]
+    return value
+
+
+def _matches_condition(value, condition) -> bool:
+    if isinstance(condition, dict) and condition and all(k.startswith("$") for k in condition):
+        for op, arg in condition.items():
+            if op == "$in":
+                if value is _MISSING or value not in arg:
+                    return False
+            elif op == "$ne":
+                if value is not _MISSING and value == arg:
+                    return False
+            elif op == "$exists":
+                if (value is not _MISSING) != bool(arg):
+                    return False
+            else:
+                raise NotImplementedError(f"Query operator {op} is not supported")
+        return True
+    if isinstance(value, list) and not isinstance(condition, list):
+        return condition in value
+    return value is not _MISSING and value == condition
+
+
+def _match_array_field(doc: Dict, path: str, condition):
+    """Matches "field.sub" against an array of sub-documents; returns the first matching index."""
+    head, _, rest = path.partition(".")
+    items = doc.get(head)
+    if not isinstance(items, list) or not rest:
+        return None
+    for index, item in enumerate(items):
+        if isinstance(item, dict) and _matches_condition(_get_path(item, rest), condition):
+            return index
+    return None
+
+
+def _matches(doc: Dict, query: Dict):
+    """Returns (matched, positional index for "$" updates)."""
+    position = None
+    for path, condition in query.items():
+        if "." in path and isinstance(doc.get(path.split(".", 1)[0]), list):
+            index = _match_array_field(doc, path, condition)
+            if index is None:
+                return False, None
+            position = index
+        elif not _matches_condition(_get_path(doc, path), condition):
+            return False, None
+    return True, position
+
+
+def _project(doc: Dict, projection: Optional[Dict]) -> Dict:
+    if not projection:
+        return copy.deepcopy(doc)
+    include_id = projection.get("_id", 1)
+    fields = {k: v for k, v in projection.items() if k != "_id"}
+    if fields and all(fields.values()):
+        out = {k: copy.deepcopy(doc[k]) for k in fields if k in doc}
+    else:
+        out = {k: copy.deepcopy(v) for k, v in doc.items() if k not in fields}
+    if include_id and "_id" in doc:
+        out["_id"] = doc["_id"]
+    else:
+        out.pop("_id", None)
+    return out
+
+
+def _set_path(doc: Dict, path: str, value, position):
+    parts = path.split(".")
+    target = doc
+    for part in parts[:-1]:
+        if part == "$":
+            target = target[position]
+        elif isinstance(target, list):
+            target = target[int(part)]
+        else:
+            target = target.setdefault(part, {})
+    target[parts[-1]] = value
+
+
+def _apply_update(doc: Dict, update: Dict, position=None):
+    for op, fields in update.items():
+        for path, value in fields.items():
+            if op == "$set":
+                _set_path(doc, path, copy.deepcopy(value), position)
+            elif op == "$inc":
+                current = _get_path(doc, path)
+                _set_path(doc, path, (0 if current is _MISSING else current) + value, position)
+            elif op == "$unset":
+                doc.pop(path, None)
+            elif op == "$push":
+                doc.setdefault(path, []).append(copy.deepcopy(value))
+            else:
+                raise NotImplementedError(f"Update operator {op} is not supported")
+
+
+class InMemoryCollection:
+    """A pymongo.Collection look-alike backed by a dict keyed by _id.
+
+    `database.latency` seconds are slept at the start of every operation to
+    simulate the network round trip.
+    """
+
+    def __init__(self, name: str, database=None):
+        self.name = name
+        self.database = database
+        self._docs = {}
+        self._lock = threading.Lock()
+
+    def _roundtrip(self):
+        if self.database is not None and self.database.latency:
+            time.sleep(self.database.latency)
+
+    def _select(self, query: Optional[Dict]) -> List[Dict]:
+        query = query or {}
+        if set(query) == {"_id"}:
+            # Primary-key lookups use the dict, as Mongo would use the _id index
+            wanted = query["_id"]
+            if not isinstance(wanted, dict):
+                wanted = {"$in": [wanted]}
+            if set(wanted) == {"$in"}:
+                return [self._docs[i] for i in dict.fromkeys(wanted["$in"]) if i in self._docs]
+        return [doc for doc in self._docs.values() if _matches(doc, query)[0]]
+
+    def insert_one(self, doc: Dict):
+        self._roundtrip()
+        stored = copy.deepcopy(doc)
+        stored.setdefault("_id", ObjectId())
+        with self._lock:
+            if stored["_id"] in self._docs:
+                raise ValueError(f"Duplicate _id {stored['_id']!r} in {self.name}")
+            self._docs[stored["_id"]] = stored
+        return SimpleNamespace(inserted_id=stored["_id"])
+
+    def insert_many(self, docs: Iterable[Dict]):
+        self._roundtrip()
+        inserted = []
+        with self._lock:
+            for doc in docs:
+                stored = copy.deepcopy(doc)
+                stored.setdefault("_id", ObjectId())
+                self._docs[stored["_id"]] = stored
+                inserted.append(stored["_id"])
+        return SimpleNamespace(inserted_ids=inserted)
+
+    def find(self, query: Optional[Dict] = None, projection: Optional[Dict] = None):
+        self._roundtrip()
+        with self._lock:
+            return iter([_project(doc, projection) for doc in self._select(query)])
+
+    def find_one(self, query: Optional[Dict] = None, projection: Optional[Dict] = None):
+        self._roundtrip()
+        with self._lock:
+            docs = self._select(query)
+            return _project(docs[0], projection) if docs else None
+
+    def distinct(self, key: str, query: Optional[Dict] = None) -> List:
+        self._roundtrip()
+        with self._lock:
+            values = [_get_path(doc, key) for doc in self._select(query)]
+        return list(dict.fromkeys(v for v in values if v is not _MISSING))
+
+    def update_one(self, query: Dict, update: Dict, upsert: bool = False):
+        self._roundtrip()
+        with self._lock:
+            for doc in self._docs.values():
+                matched, position = _matches(doc, query)
+                if matched:
+                    _apply_update(doc, update, position)
+                    return SimpleNamespace(matched_count=1, modified_count=1, upserted_id=None)
+            if not upsert:
+                return SimpleNamespace(matched_count=0, modified_count=0, upserted_id=None)
+            doc = {k: copy.deepcopy(v) for k, v in query.items() if not isinstance(v, dict)}
+            doc.setdefault("_id", ObjectId())
+            _apply_update(doc, update)
+            self._docs[doc["_id"]] = doc
+            return SimpleNamespace(matched_count=0, modified_count=0, upserted_id=doc["_id"])
+
+    def find_one_and_update(self, query: Dict, update: Dict, projection: Optional[Dict] = None,
+                            upsert: bool = False, return_document: bool = False):
+        self._roundtrip()
+        with self._lock:
+            for doc in self._docs.values():
+                matched, position = _matches(doc, query)
+                if matched:
+                    before = copy.deepcopy(doc)
+                    _apply_update(doc, update, position)
+                    return _project(doc if return_document else before, projection)
+            if not upsert:
+                return None
+            doc = {k: copy.deepcopy(v) for k, v in query.items() if not isinstance(v, dict)}
+            doc.setdefault("_id", ObjectId())
+            _apply_update(doc, update)
+            self._docs[doc["_id"]] = doc
+            return _project(doc, projection) if return_document else None
+
+    def replace_one(self, query: Dict, replacement: Dict, upsert: bool = False):
+        self._roundtrip()
+        with self._lock:
+            existing = self._select(query)
+            if not existing and not upsert:
+                return SimpleNamespace(matched_count=0, modified_count=0)
+            doc = copy.deepcopy(replacement)
+            doc["_id"] = existing[0]["_id"] if existing else doc.get("_id", ObjectId())
+            self._docs[doc["_id"]] = doc
+            return SimpleNamespace(matched_count=len(existing[:1]), modified_count=len(existing[:1]))
+
+    def delete_many(self, query: Dict):
+        self._roundtrip()
+        with self._lock:
+            doomed = [doc["_id"] for doc in self._select(query)]
+            for _id in doomed:
+                del self._docs[_id]
+        return SimpleNamespace(deleted_count=len(doomed))
+
+    def count_documents(self, query: Dict) -> int:
+        self._roundtrip()
+        with self._lock:
+            return len(self._select(query))
+
+    def create_index(self, keys, **kwargs) -> str:
+        return "_".join(f"{field}_{direction}" for field, direction in keys)
+
+    def bulk_write(self, requests, ordered: bool = True):
+        raise NotImplementedError("bulk_write is not supported by the in-memory stand-in")
+
+
+class InMemoryDatabase:
+    """A pymongo.Database look-alike; collections are created on first access."""
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self._collections = {}
+        self._lock = threading.Lock()
+
+    def __getitem__(self, name: str) -> InMemoryCollection:
+        with self._lock:
+            if name not in self._collections:
+                self._collections[name] = InMemoryCollection(name, self)
+            return self._collections[name]
+
+    def __getattr__(self, name: str) -> InMemoryCollection:
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return self[name]
+
+    def reset(self):
+        """Drops every document while keeping the collection objects callers hold."""
+        with self._lock:
+            for collection in self._collections.values():
+                with collection._lock:
+                    collection._docs.clear()
@@ -0,0 +1,36 @@
+"""Lets the app's modules be imported and exercised without MongoDB or Gemini.
+
+utils/config.py raises at import when MONGO_URI is unset and binds
+`mongo_db` to a live database, and every store captures that binding when
+its module is imported. install() therefore has to run before anything
+imports utils.*: it supplies placeholder credentials (pymongo connects
+lazily, so the placeholder URI is never contacted) and swaps `mongo_db`
+for an in-memory stand-in.
+"""
+import os
+import sys
+import tempfile
+from typing import Optional
+from benchmarks.memory_mongo import InMemoryDatabase
+
+_database: Optional[InMemoryDatabase] = None
+
+
+def install(extract_workers: int = None) -> InMemoryDatabase:
+    """Patches utils.config for offline use and returns the in-memory database."""
+    global _database
+    if _database is not None:
+        return _database
+    imported = sorted(name for name in sys.modules if name.startswith("utils.") and name != "utils.config")
+    if imported:
+        raise RuntimeError(f"install() must run before these modules are imported: {', '.join(imported)}")
+    os.environ.setdefault("MONGO_URI", "mongodb://localhost:27017")
+    os.environ.setdefault("GOOGLE_API_KEY", "offline-benchmark")
+    os.environ["TEXT_EMBEDDING_CACHE_PATH"] = os.path.join(tempfile.mkdtemp(prefix="rag-bench-"), "embeddings.sqlite3")
+    if extract_workers is not None:
+        # Read at import by utils.config, here and in spawned extraction workers
+        os.environ["EXTRACT_WORKERS"] = str(extract_workers)
+    import utils.config as config
+    _database = InMemoryDatabase()
+    config.mongo_db = _database
+    return _database
@@ -0,0 +1,294 @@
+"""Offline benchmark suite for the indexing and query paths.
+
+Usage: python -m benchmarks.suite [--scenarios chunking index query batch mmr]
+           [--sizes small medium] [--output results.json]
+           [--baseline previous.json --tolerance 0.25]
+
+Gemini is replaced by deterministic fakes with configurable latency and
+MongoDB by an in-memory stand-in (see benchmarks/offline.py), so the suite
+runs anywhere and results are comparable between runs on one machine.
+Each scenario reports throughput, p50/p95 latency per operation and the
+peak Python heap of one extra run traced with tracemalloc. With
+--baseline, exits 1 if any scenario's p95 or throughput is worse than the
+baseline by more than --tolerance.
+"""
+import argparse
+import contextlib
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Callable, Dict, List, Optional
+import numpy as np
+from benchmarks.offline import install
+
+SCENARIOS = ("chunking", "index", "query", "batch", "mmr")
+# Chunks in the synthetic embedding matrix for the mmr scenario
+MMR_SIZES = {"small": 1_000, "medium": 10_000, "large": 50_000}
+
+
+def measure(scenario: str, size: str, op: Callable[[int], int], count: int, unit: str,
+            cleanup: Callable[[int], None] = None, warmup: int = 0) -> Dict:
+    """
+    Times op(i) for i in range(count); op returns the number of `unit`s it
+    processed. `cleanup(i)` runs untimed after each op. One more op runs
+    under tracemalloc for the peak memory figure.
+    """
+    for i in range(warmup):
+        op(-1 - i)
+        if cleanup:
+            cleanup(-1 - i)
+    latencies, units = [], 0
+    for i in range(count):
+        start = time.perf_counter()
+        units += op(i)
+        latencies.append(time.perf_counter() - start)
+        if cleanup:
+            cleanup(i)
+    tracemalloc.start()
+    try:
+        op(count)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    if cleanup:
+        cleanup(count)
+    total = sum(latencies)
+    return {
+        "scenario": scenario,
+        "size": size,
+        "operations": count,
+        "throughput": units / total if total else 0.0,
+        "throughput_unit": f"{unit}/s",
+        "p50_ms": float(np.percentile(latencies, 50)) * 1000,
+        "p95_ms": float(np.percentile(latencies, 95)) * 1000,
+        "mean_ms": total / count * 1000,
+        "peak_memory_mb": peak / (1024 * 1024),
+    }
+
+
+class Suite:
+    def __init__(self, args, database):
+        from benchmarks.corpus import CORPUS_SIZES, CorpusGenerator
+        self.args = args
+        self.database = database
+        self.corpus_sizes = CORPUS_SIZES
+        self.generator = CorpusGenerator(seed=args.seed)
+        self.workdir = tempfile.mkdtemp(prefix="rag-bench-")
+        self.folders = {}
+
+    def folder(self, size: str) -> str:
+        if size not in self.folders:
+            documents, chars = self.corpus_sizes[size]
+            folder = os.path.join(self.workdir, size)
+            self.generator.write_folder(folder, documents, chars)
+            self.folders[size] = folder
+        return self.folders[size]
+
+    def services(self):
+        """A fresh registry with fake Gemini clients; stores are built lazily on the in-memory database."""
+        from benchmarks.fakes import FakeEmbeddingGenerator, FakeRAGEngine
+        from utils.services import ServiceRegistry, set_services
+        registry = ServiceRegistry(
+            embedder=FakeEmbeddingGenerator(latency=self.args.embed_latency),
+            rag_engine=FakeRAGEngine(latency=self.args.llm_latency, token_latency=self.args.token_latency),
+        )
+        set_services(registry)
+        return registry
+
+    def index_folder(self, folder: str, user_id: str) -> int:
+        """Runs index_documents and returns the number of chunks stored; raises on any file error."""
+        from main import index_documents
+        stored, errors = [0], []
+
+        def progress(filename, status, chunks=0, error=None):
+            stored[0] += chunks
+            if status == "error":
+                errors.append(f"{filename}: {error}")
+
+        index_documents(folder, user_id=user_id, progress=progress)
+        if errors:
+            raise RuntimeError("Indexing failed: " + "; ".join(errors))
+        return stored[0]
+
+    def drop_user(self, user_id: str):
+        from utils.services import get_services
+        services = get_services()
+        services.embedding_store.clear_user_embeddings(user_id)
+        services.manifest.remove(user_id)
+
+    def run_chunking(self, size: str) -> Dict:
+        from utils.ingestion_pipeline import extract_and_chunk
+        folder = self.folder(size)
+        paths = sorted(os.path.join(folder, name) for name in os.listdir(folder))
+
+        def op(i):
+            return extract_and_chunk(paths[i % len(paths)])["text_length"]
+
+        return measure("chunking", size, op, max(len(paths), self.args.iterations), "chars")
+
+    def run_index(self, size: str) -> Dict:
+        folder = self.folder(size)
+        users = {}
+
+        def op(i):
+            # A fresh embedder per run keeps the text embedding cache cold
+            self.services()
+            users[i] = f"bench-index-{size}-{i}"
+            return self.index_folder(folder, users[i])
+
+        def cleanup(i):
+            self.drop_user(users.pop(i))
+
+        return measure("index", size, op, self.args.iterations, "chunks", cleanup=cleanup, warmup=1)
+
+    def run_query(self, size: str) -> Dict:
+        from flask import Flask, session
+        from main import query_rag
+        from utils.answer_cache import answer_cache
+        self.services()
+        user_id = f"bench-query-{size}"
+        self.index_folder(self.folder(size), user_id)
+        queries = [self.generator.query() for _ in range(self.args.queries + 1)]
+        app = Flask(__name__)
+        app.secret_key = "offline-benchmark"
+
+        def op(i):
+            # Every query takes the full retrieve-and-generate path
+            answer_cache.invalidate(user_id)
+            query_rag(queries[i % len(queries)], chat_history=[])
+            return 1
+
+        with app.test_request_context():
+            session["user_id"] = user_id
+            result = measure("query", size, op, self.args.queries, "queries", warmup=1)
+        self.drop_user(user_id)
+        return result
+
+    def run_batch(self, size: str) -> Dict:
+        from main import query_rag_batch
+        from utils.answer_cache import answer_cache
+        self.services()
+        user_id = f"bench-batch-{size}"
+        self.index_folder(self.folder(size), user_id)
+        batch = [self.generator.query() for _ in range(self.args.queries)]
+
+        def op(i):
+            # Same work per question as the query scenario: no answer cache hits
+            answer_cache.invalidate(user_id)
+            return sum(1 for _ in query_rag_batch(batch, user_id))
+
+        result = measure("batch", size, op, self.args.iterations, "queries", warmup=1)
+        self.drop_user(user_id)
+        return result
+
+    def run_mmr(self, size: str) -> Dict:
+        from utils.ann_index import IVFIndex
+        from utils.config import ANN_MIN_CHUNKS, ANN_NPROBE
+        from utils.retrieval import EmbeddingMatrix
+        rng = np.random.default_rng(self.args.seed)
+        n, dim = MMR_SIZES[size], 768
+        matrix = EmbeddingMatrix(rng.standard_normal((n, dim), dtype=np.float32), list(range(n)), dim=dim)
+        if n >= ANN_MIN_CHUNKS:
+            # Same rule as MongoEmbeddingStore: large corpora search IVF candidates
+            matrix.attach_ann(IVFIndex.train(matrix.matrix), ANN_NPROBE)
+        queries = rng.standard_normal((self.args.queries + 1, dim), dtype=np.float32)
+
+        def op(i):
+            matrix.mmr(queries[i % len(queries)], lambda_param=0.7, top_k=10)
+            return 1
+
+        return measure("mmr", size, op, self.args.queries, "queries")
+
+    def run(self) -> List[Dict]:
+        results = []
+        for scenario in self.args.scenarios:
+            for size in self.args.sizes:
+                print(f"Running {scenario} [{size}]...", file=sys.stderr)
+                with self.quiet():
+                    results.append(getattr(self, f"run_{scenario}")(size))
+                self.database.reset()
+        return results
+
+    @contextlib.contextmanager
+    def quiet(self):
+        """Silences the app's progress prints (stdout carries the report) unless --verbose."""
+        if self.args.verbose:
+            with contextlib.redirect_stdout(sys.stderr):
+                yield
+            return
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            yield
+
+
+def compare(results: List[Dict], baseline: Dict, tolerance: float) -> List[str]:
+    """Returns one message per scenario that regressed beyond `tolerance` against `baseline`."""
+    previous = {(r["scenario"], r["size"]): r for r in baseline.get("results", [])}
+    regressions = []
+    for result in results:
+        before = previous.get((result["scenario"], result["size"]))
+        if before is None:
+            continue
+        name = f"{result['scenario']} [{result['size']}]"
+        if result["p95_ms"] > before["p95_ms"] * (1 + tolerance):
+            regressions.append(f"{name}: p95 {before['p95_ms']:.1f} ms -> {result['p95_ms']:.1f} ms")
+        if result["throughput"] < before["throughput"] * (1 - tolerance):
+            regressions.append(f"{name}: throughput {before['throughput']:.1f} -> {result['throughput']:.1f} "
+                               f"{result['throughput_unit']}")
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument("--sizes", nargs="+", choices=["small", "medium", "large"], default=["small", "medium"])
+    parser.add_argument("--iterations", type=int, default=5, help="runs per index and batch scenario (minimum for chunking)")
+    parser.add_argument("--queries", type=int, default=50, help="queries per query and mmr scenario, and per batch")
+    parser.add_argument("--embed-latency", type=float, default=0.0, help="seconds per fake embedding request")
+    parser.add_argument("--llm-latency", type=float, default=0.0, help="seconds to the fake model's first token")
+    parser.add_argument("--token-latency", type=float, default=0.0, help="seconds per fake model token")
+    parser.add_argument("--mongo-latency", type=float, default=0.0, help="seconds per in-memory Mongo operation")
+    parser.add_argument("--extract-workers", type=int, default=None, help="overrides EXTRACT_WORKERS")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    parser.add_argument("--baseline", help="earlier JSON report to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    parser.add_argument("--verbose", action="store_true", help="show the app's progress output on stderr")
+    args = parser.parse_args(argv)
+
+    database = install(extract_workers=args.extract_workers)
+    database.latency = args.mongo_latency
+    from utils.config import EXTRACT_WORKERS
+    results = Suite(args, database).run()
+    report = {
+        "environment": {
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "extract_workers": EXTRACT_WORKERS,
+        },
+        "config": {k: v for k, v in vars(args).items() if k not in ("output", "baseline", "verbose")},
+        "results": results,
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for message in regressions:
+            print(f"REGRESSION {message}", file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
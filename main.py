@@ -1,132 +1,436 @@
+import contextvars
 import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import List
 from utils.config import *  
-from utils.document_processor import DocumentProcessor 
-from utils.text_chunker import TextChunker 
-from utils.embedding_generator import EmbeddingGenerator
-from utils.rag_engine import RAGEngine 
+from utils.services import get_services
+from utils.answer_cache import answer_cache, is_context_dependent
+from utils.ingestion_pipeline import chunk_params, extract_and_chunk, get_extraction_pool
+from utils import metrics
+from utils.query_pipeline import QueryPipeline
 
-def index_documents(folder_path: str):
-    """Ingests, processes, and indexes all documents from a folder."""
+def index_documents(folder_path: str, user_id: str = None, progress=None, content_hashes=None):
+    """Ingests, processes, and indexes new or changed documents from a folder.
+
+    Files whose content hash, chunker parameters and embedding model match the
+    ingestion manifest are skipped; modified files have their old chunks
+    replaced. A file whose content is already indexed under another name or
+    user gets a copy of those chunks and embeddings, without extraction or
+    embedding. `user_id` defaults to the logged-in session user. If `progress`
+    is given it is called as progress(filename, status, chunks=0, error=None)
+    and per-file errors are reported through it instead of raised. If
+    `content_hashes` (filename -> SHA-256, e.g. computed while uploading) is
+    given, only those files are indexed and they are not re-read for hashing.
+    """
     print("--- Starting Document Indexing ---")
     
+    from concurrent.futures import wait, FIRST_COMPLETED
     from flask import session
-    from utils.mongo_embedding_store import MongoEmbeddingStore
-    processor = DocumentProcessor()
-    embedder = EmbeddingGenerator(EMBEDDING_MODEL_NAME)
-    # chunker will be created per document with dynamic chunk size
-    # ...existing code...
-    mongo_store = MongoEmbeddingStore()
+    from utils.ingestion_manifest import file_sha256
+    services = get_services()
+    embedder = services.embedder
+    mongo_store = services.embedding_store
+    manifest = services.manifest
+    # Extraction and chunking fan out over worker processes; embedding and storing
+    # happen here as each file's chunks come back, overlapping with later parses.
+    pool = get_extraction_pool()
+    max_in_flight = 2 * EXTRACT_WORKERS
 
     all_chunks = []
+    skipped = []
+    pending = {}
+
+    if user_id is None:
+        user_id = session.get('user_id', 'anonymous')
+
+    def report_error(filename, e):
+        if progress is None:
+            raise e
+        print(f"Failed to index {filename}: {e}")
+        progress(filename, "error", error=str(e))
 
-    user_id = session.get('user_id', 'anonymous')
+    def store_result(filename, content_hash, entry, result):
+        if not result:
+            if progress:
+                progress(filename, "error", error="No text could be extracted")
+            return
+        for stage, seconds in result["timings"].items():
+            metrics.record_stage(stage, seconds)
+        chunks = result["chunks"]
+        chunk_texts = [chunk["text"] for chunk in chunks]
+        embeddings = embedder.generate_embeddings(chunk_texts)
+        doc_id = filename
+        with metrics.timed("store"):
+            if entry:
+                # Replace the stale chunks of a modified file
+                mongo_store.delete_document_embeddings(user_id, doc_id)
+            mongo_store.add_chunk_embeddings(user_id, doc_id, chunks, embeddings)
+            manifest.record(user_id, doc_id, content_hash, result["text_length"],
+                            result["chunk_size"], result["chunk_overlap"],
+                            embedder.embedding_model_name, len(chunks),
+                            os.path.getsize(os.path.join(folder_path, filename)))
+        metrics.chunks_indexed.inc(len(chunks))
+        all_chunks.extend(chunks)
+        if progress:
+            progress(filename, "indexed", chunks=len(chunks))
 
-    for filename in os.listdir(folder_path):
+    def reuse_indexed(filename, content_hash, entry):
+        """Copies the chunks of an indexed file with the same content; False if there is none."""
+        for source in manifest.find_by_content(content_hash, embedder.embedding_model_name):
+            if ((source["user_id"], source["doc_id"]) == (user_id, filename) or not source.get("chunk_count")
+                    or (source.get("chunk_size"), source.get("chunk_overlap")) != chunk_params(source.get("text_length", 0))):
+                continue
+            with metrics.timed("store"):
+                if entry:
+                    mongo_store.delete_document_embeddings(user_id, filename)
+                    entry = None
+                copied = mongo_store.copy_document_embeddings(source["user_id"], source["doc_id"], user_id, filename)
+                if not copied:
+                    # The source was deleted meanwhile
+                    continue
+                manifest.record(user_id, filename, content_hash, source["text_length"],
+                                source["chunk_size"], source["chunk_overlap"],
+                                embedder.embedding_model_name, copied,
+                                os.path.getsize(os.path.join(folder_path, filename)))
+            print(f"Reused {copied} indexed chunks for identical content of {filename}")
+            if progress:
+                progress(filename, "indexed", chunks=copied)
+            return True
+        return False
+
+    def drain(return_when):
+        done, _ = wait(pending, return_when=return_when)
+        for future in done:
+            filename, content_hash, entry = pending.pop(future)
+            try:
+                store_result(filename, content_hash, entry, future.result())
+            except Exception as e:
+                report_error(filename, e)
+
+    filenames = list(content_hashes) if content_hashes is not None else os.listdir(folder_path)
+    for filename in filenames:
         file_path = os.path.join(folder_path, filename)
-        if os.path.isfile(file_path):
+        if not os.path.isfile(file_path):
+            continue
+        try:
+            doc_id = filename
+            content_hash = (content_hashes or {}).get(filename) or file_sha256(file_path)
+            entry = manifest.get(user_id, doc_id)
+            if (entry
+                    and entry.get("content_hash") == content_hash
+                    and entry.get("embedding_model") == embedder.embedding_model_name
+                    and (entry.get("chunk_size"), entry.get("chunk_overlap")) == chunk_params(entry.get("text_length", 0))):
+                print(f"Skipping unchanged {filename}")
+                skipped.append(filename)
+                if progress:
+                    progress(filename, "skipped")
+                continue
+            if reuse_indexed(filename, content_hash, entry):
+                skipped.append(filename)
+                continue
             print(f"\nProcessing {filename}...")
-            document = processor.process_document(file_path)
-            if document:
-                doc_length = len(document["text"])
-                if doc_length < 2000:
-                    dynamic_chunk_size = 300
-                    dynamic_overlap = 50
-                elif doc_length < 5000:
-                    dynamic_chunk_size = 500
-                    dynamic_overlap = 80
-                else:
-                    dynamic_chunk_size = 800
-                    dynamic_overlap = 120
-                chunker = TextChunker(dynamic_chunk_size, dynamic_overlap, embedder)
-                chunks = chunker.create_chunks(document)
-                chunk_texts = [chunk["text"] for chunk in chunks]
-                embeddings = embedder.generate_embeddings(chunk_texts)
-                doc_id = filename
-                mongo_store.add_chunk_embeddings(user_id, doc_id, chunks, embeddings)
-                all_chunks.extend(chunks)
-
-    if not all_chunks:
+            if progress:
+                progress(filename, "processing")
+            if pool is None:
+                store_result(filename, content_hash, entry, extract_and_chunk(file_path))
+                continue
+            pending[pool.submit(extract_and_chunk, file_path)] = (filename, content_hash, entry)
+            if len(pending) >= max_in_flight:
+                drain(FIRST_COMPLETED)
+        except Exception as e:
+            report_error(filename, e)
+
+    while pending:
+        drain(FIRST_COMPLETED)
+
+    if not all_chunks and not skipped:
         print("No documents were processed. Exiting.")
         return
 
     print("\n--- Document Indexing Complete ---")
-    print(f"Total chunks stored in MongoDB: {len(all_chunks)}")
+    print(f"Chunks stored in MongoDB: {len(all_chunks)} (skipped {len(skipped)} unchanged or already indexed file(s))")
     return True
 
 
-def query_rag(query: str, chat_history=None):
-    """Queries the RAG system to get an answer. Optionally uses chat history."""
-    print("\n--- Querying RAG System ---")
-    embedder = EmbeddingGenerator(EMBEDDING_MODEL_NAME)
-    rag = RAGEngine(GEMINI_API_KEY, GEMINI_MODEL_NAME)
-    from flask import session
-    from utils.mongo_embedding_store import MongoEmbeddingStore
-    user_id = session.get('user_id', 'anonymous')
-    mongo_store = MongoEmbeddingStore()
-    query_embedding = embedder.generate_embeddings([query])[0]
+def _fetch_matrix(mongo_store, user_id: str, corpus_version: int = None):
+    with metrics.timed("fetch"):
+        return mongo_store.get_user_matrix(user_id, corpus_version)
 
-    all_chunks = mongo_store.get_user_embeddings(user_id)
-    if not all_chunks:
-        print("No documents in DB. Returning 'No Source Provided'.")
-        return "No Source Provided"
-    def cosine_similarity(a, b):
-        import math
-        denom_a = math.sqrt(sum(x * x for x in a))
-        denom_b = math.sqrt(sum(x * x for x in b))
-        if denom_a == 0 or denom_b == 0:
-            return 0.0
-        return sum(x * y for x, y in zip(a, b)) / (denom_a * denom_b)
-
-    # Maximal Marginal Relevance (MMR) for diversity
-    def mmr(query_emb, chunks, lambda_param=0.7, top_k=10):
-        selected = []
-        selected_indices = set()
-        chunk_embs = [chunk['embedding'] for chunk in chunks]
-        scores = [cosine_similarity(query_emb, emb) for emb in chunk_embs]
-        for _ in range(top_k):
-            if not selected:
-                idx = scores.index(max(scores))
-                selected.append(chunks[idx])
-                selected_indices.add(idx)
-            else:
-                mmr_scores = []
-                for i, chunk in enumerate(chunks):
-                    if i in selected_indices:
-                        mmr_scores.append(float('-inf'))
-                        continue
-                    relevance = scores[i]
-                    diversity = max([cosine_similarity(chunk_embs[i], chunk['embedding']) for chunk in selected])
-                    mmr_score = lambda_param * relevance - (1 - lambda_param) * diversity
-                    mmr_scores.append(mmr_score)
-                idx = mmr_scores.index(max(mmr_scores))
-                selected.append(chunks[idx])
-                selected_indices.add(idx)
-        return selected
-
-    mmr_chunks = mmr(query_embedding, all_chunks, lambda_param=0.7, top_k=10)
-    retrieved_chunks = [
-        {"text": chunk["chunk_text"], "metadata": chunk["metadata"]}
-        for chunk in mmr_chunks
-    ]
+
+def _lexical_ids(mongo_store, user_id: str, query: str):
+    # BM25 candidates catch exact terms (part numbers, codes) that embeddings miss
+    with metrics.timed("lexical"):
+        lexical_hits = mongo_store.get_lexical_index(user_id).search(query, HYBRID_CANDIDATES)
+    return [chunk_id for chunk_id, _ in lexical_hits]
+
+
+def _context_chunk(chunk):
+    return {"text": chunk["chunk_text"], "metadata": chunk["metadata"], "chunk_id": chunk.get("chunk_id")}
+
+
+def _select_context(mongo_store, index, query_embedding, lexical_ids=None):
+    """Runs MMR over the user's matrix and fetches the selected chunks' text."""
+    # Maximal Marginal Relevance (MMR) for diversity, vectorized over the user's matrix
+    selected = index.mmr(query_embedding, lambda_param=0.7, top_k=10, lexical_ids=lexical_ids,
+                         fusion_candidates=HYBRID_CANDIDATES, rrf_k=RRF_K)
+    with metrics.timed("fetch_text"):
+        mmr_chunks = mongo_store.get_chunks_by_ids([index.ids[i] for i in selected])
+    metrics.chunks_retrieved.inc(len(mmr_chunks))
+    retrieved_chunks = [_context_chunk(chunk) for chunk in mmr_chunks]
     print(f"\nFound {len(retrieved_chunks)} relevant context chunks.")
     for i, chunk in enumerate(retrieved_chunks):
         print(f"Context {i+1} (from {chunk['metadata'].get('source', '')}):")
         print(chunk['text'][:200] + "...")
         print("-" * 20)
+    return retrieved_chunks
+
+
+def retrieve_context(query: str, user_id: str, query_embedding=None):
+    """Returns the MMR-selected context chunks for a query, or None if the user has no documents."""
+    services = get_services()
+    mongo_store = services.embedding_store
+    if query_embedding is None:
+        query_embedding = services.embedder.generate_embeddings([query])[0]
+    index = _fetch_matrix(mongo_store, user_id)
+    if not len(index):
+        return None
+    lexical_ids = _lexical_ids(mongo_store, user_id, query) if HYBRID_RETRIEVAL else None
+    return _select_context(mongo_store, index, query_embedding, lexical_ids)
+
+
+def gather_context(query: str, user_id: str, chat_history=None, pipeline: QueryPipeline = None):
+    """
+    Front half of a query with its independent waits overlapped: the query
+    embedding (Gemini), the user's matrix and corpus version (MongoDB or the
+    in-process cache) and the BM25 search all start at once on the query pool.
+    The answer cache is checked as soon as the embedding and version arrive.
+
+    Returns (cached, retrieved_chunks, query_embedding, corpus_version):
+    cached is an answer-cache hit or None; retrieved_chunks is None if the
+    user has no documents; corpus_version is None when the query bypasses the
+    answer cache or the matrix was not loaded at that version (so the answer
+    is not cached). Raises QueryTimeout or QueryCancelled.
+    """
+    services = get_services()
+    embedder = services.embedder
+    mongo_store = services.embedding_store
+    pipeline = pipeline or QueryPipeline()
+    bypass_cache = is_context_dependent(query, chat_history)
+    try:
+        embedding_future = pipeline.submit(lambda: embedder.generate_embeddings([query])[0])
+        # The matrix is served from cache only at this version, so it is read once and shared
+        version_future = pipeline.submit(mongo_store.get_corpus_version, user_id)
+        matrix_future = pipeline.submit(lambda: _fetch_matrix(mongo_store, user_id, version_future.result()))
+        lexical_future = pipeline.submit(_lexical_ids, mongo_store, user_id, query) if HYBRID_RETRIEVAL else None
+
+        query_embedding = pipeline.result(embedding_future, "query embedding", QUERY_EMBED_TIMEOUT)
+        if bypass_cache:
+            answer_cache.record_bypass()
+            corpus_version = None
+        else:
+            corpus_version = pipeline.result(version_future, "corpus version", QUERY_FETCH_TIMEOUT)
+            cached = answer_cache.get(user_id, query_embedding, corpus_version)
+            if cached:
+                pipeline.cancel()
+                return cached, None, query_embedding, corpus_version
+
+        index = pipeline.result(matrix_future, "embedding fetch", QUERY_FETCH_TIMEOUT)
+        if index.corpus_version != corpus_version:
+            # An answer from another version's chunks must not be cached under this one
+            corpus_version = None
+        if not len(index):
+            pipeline.cancel()
+            return None, None, query_embedding, corpus_version
+        lexical_ids = pipeline.result(lexical_future, "lexical search", QUERY_FETCH_TIMEOUT) if lexical_future else None
+        return None, _select_context(mongo_store, index, query_embedding, lexical_ids), query_embedding, corpus_version
+    except BaseException:
+        pipeline.cancel()
+        raise
+
+
+def source_labels(chunks):
+    """Distinct citation labels for chunks, e.g. "manual.pdf p.3-4" or "deck.pptx slide 2"."""
+    labels = []
+    for chunk in chunks:
+        metadata = chunk['metadata']
+        label = metadata.get('source', '')
+        for key, name in (('page', 'p.'), ('slide', 'slide ')):
+            if key in metadata:
+                label += f" {name}{metadata[key]}"
+                if f"{key}_end" in metadata:
+                    label += f"-{metadata[f'{key}_end']}"
+        labels.append(label)
+    return list(dict.fromkeys(labels))
+
+
+def remember_answer(user_id: str, query_embedding, corpus_version, answer: str, retrieved_chunks):
+    """Stores a generated answer in the answer cache unless it was an error or bypassed."""
+    if corpus_version is None or answer.startswith("An error occurred"):
+        return
+    sources = source_labels(retrieved_chunks)
+    answer_cache.put(user_id, query_embedding, corpus_version, answer, sources)
+
+
+def query_rag(query: str, chat_history=None, user_id: str = None):
+    """
+    Queries the RAG system to get an answer. Optionally uses chat history.
+    `user_id` defaults to the logged-in session user.
+    """
+    print("\n--- Querying RAG System ---")
+    rag = get_services().rag_engine
+    if user_id is None:
+        from flask import session
+        user_id = session.get('user_id', 'anonymous')
+    cached, retrieved_chunks, query_embedding, corpus_version = gather_context(query, user_id, chat_history)
+    if cached:
+        print(f"Answer cache hit (similarity {cached['similarity']:.3f})")
+        return cached["answer"]
+    if retrieved_chunks is None:
+        print("No documents in DB. Returning 'No Source Provided'.")
+        return "No Source Provided"
     answer = rag.generate_response(query, retrieved_chunks, chat_history=chat_history)
+    if retrieved_chunks:
+        remember_answer(user_id, query_embedding, corpus_version, answer, retrieved_chunks)
     print("\n--- Final Answer ---")
     print(answer)
     return answer
 
-    if __name__ == "__main__":
-        if not os.path.exists(DOCUMENTS_DIR):
-            os.makedirs(DOCUMENTS_DIR)
-            print(f"Created directory: {DOCUMENTS_DIR}")
-            print(f"Please add your PDF, DOCX, PPTX, or TXT files to the '{DOCUMENTS_DIR}' folder and run the script again.")
-        else:
-            index_documents(DOCUMENTS_DIR)
-            while True:
-                user_query = input("\nEnter your question (or type 'exit' to quit): ")
-                if user_query.lower() == 'exit':
-                    break
-                query_rag(user_query)
\ No newline at end of file
+
+def query_rag_stream(query: str, user_id: str, chat_history=None, cancel_event=None):
+    """
+    Streaming variant of query_rag. Yields (event, data) pairs: one "sources"
+    event with the retrieved chunk sources, then "token" events as the answer
+    is generated, then a "done" event carrying the full answer. If generation
+    fails partway, an "error" event replaces "done" and the partial answer is
+    not cached.
+
+    Setting `cancel_event`, or closing the generator (as the server does when
+    the client disconnects), abandons outstanding retrieval stages and stops
+    reading the model's stream.
+    """
+    print("\n--- Querying RAG System (streaming) ---")
+    rag = get_services().rag_engine
+    pipeline = QueryPipeline(cancel_event)
+    try:
+        cached, retrieved_chunks, query_embedding, corpus_version = gather_context(query, user_id, chat_history, pipeline)
+        if cached:
+            yield "sources", cached["sources"]
+            yield "token", cached["answer"]
+            yield "done", cached["answer"]
+            return
+        if retrieved_chunks is None:
+            yield "sources", []
+            yield "token", "No Source Provided"
+            yield "done", "No Source Provided"
+            return
+        sources = source_labels(retrieved_chunks)
+        yield "sources", sources
+        parts = []
+        try:
+            for piece in rag.generate_response_stream(query, retrieved_chunks, chat_history=chat_history):
+                if pipeline.cancelled:
+                    return
+                parts.append(piece)
+                yield "token", piece
+        except Exception as e:
+            print(f"Streaming generation failed: {e}")
+            yield "error", f"An error occurred while generating the response: {e}"
+            return
+        answer = "".join(parts)
+        if retrieved_chunks:
+            remember_answer(user_id, query_embedding, corpus_version, answer, retrieved_chunks)
+        yield "done", answer
+    finally:
+        pipeline.cancel()
+
+
+def query_rag_batch(queries: List[str], user_id: str, max_concurrency: int = QUERY_BATCH_CONCURRENCY):
+    """
+    Answers many independent questions (no chat history) against one load of
+    the user's corpus. The questions are embedded in one batched call; the
+    matrix, corpus version and BM25 index are loaded once; every question is
+    scored with a single matrix-matrix product; and the selected chunks' text
+    comes from one MongoDB query. Answers are then generated up to
+    `max_concurrency` at a time.
+
+    Yields one dict per question as soon as its answer is ready, so not in
+    input order: {"index", "query", "answer", "sources", "cached"}. Closing
+    the generator drops the generations that have not started.
+    """
+    print(f"\n--- Querying RAG System (batch of {len(queries)}) ---")
+    services = get_services()
+    rag = services.rag_engine
+    mongo_store = services.embedding_store
+    pipeline = QueryPipeline()
+    try:
+        version_future = pipeline.submit(mongo_store.get_corpus_version, user_id)
+        matrix_future = pipeline.submit(lambda: _fetch_matrix(mongo_store, user_id, version_future.result()))
+        lexical_future = pipeline.submit(mongo_store.get_lexical_index, user_id) if HYBRID_RETRIEVAL else None
+        embeddings = services.embedder.generate_embeddings(list(queries))
+        corpus_version = pipeline.result(version_future, "corpus version", QUERY_FETCH_TIMEOUT)
+        index = pipeline.result(matrix_future, "embedding fetch", QUERY_FETCH_TIMEOUT)
+        lexical_index = pipeline.result(lexical_future, "lexical index", QUERY_FETCH_TIMEOUT) if lexical_future else None
+    finally:
+        pipeline.cancel()
+    # Answers are only cached under the version the matrix was loaded at
+    answer_version = corpus_version if index.corpus_version == corpus_version else None
+
+    pending = []
+    for i, (query, embedding) in enumerate(zip(queries, embeddings)):
+        if not len(index):
+            yield {"index": i, "query": query, "answer": "No Source Provided", "sources": [], "cached": False}
+            continue
+        cached = answer_cache.get(user_id, embedding, corpus_version)
+        if cached:
+            yield {"index": i, "query": query, "answer": cached["answer"], "sources": cached["sources"], "cached": True}
+            continue
+        pending.append(i)
+    if not pending:
+        return
+
+    lexical_ids = None
+    if lexical_index is not None:
+        with metrics.timed("lexical"):
+            lexical_ids = [[chunk_id for chunk_id, _ in lexical_index.search(queries[i], HYBRID_CANDIDATES)]
+                           for i in pending]
+    selections = index.mmr_batch([embeddings[i] for i in pending], lambda_param=0.7, top_k=10,
+                                 lexical_ids=lexical_ids, fusion_candidates=HYBRID_CANDIDATES, rrf_k=RRF_K)
+    with metrics.timed("fetch_text"):
+        wanted = list(dict.fromkeys(index.ids[row] for rows in selections for row in rows))
+        by_id = {chunk["_id"]: chunk for chunk in mongo_store.get_chunks_by_ids(wanted)}
+    contexts = {
+        i: [_context_chunk(by_id[index.ids[row]]) for row in rows if index.ids[row] in by_id]
+        for i, rows in zip(pending, selections)
+    }
+    metrics.chunks_retrieved.inc(sum(len(chunks) for chunks in contexts.values()))
+
+    def answer(i):
+        chunks = contexts[i]
+        text = rag.generate_response(queries[i], chunks)
+        if chunks:
+            remember_answer(user_id, embeddings[i], answer_version, text, chunks)
+        return {"index": i, "query": queries[i], "answer": text, "sources": source_labels(chunks), "cached": False}
+
+    executor = ThreadPoolExecutor(max_workers=max(1, max_concurrency), thread_name_prefix="batch")
+    try:
+        # Each generation runs in its own copy of the context so the request's trace sees it
+        futures = [executor.submit(contextvars.copy_context().run, answer, i) for i in pending]
+        for future in as_completed(futures):
+            yield future.result()
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+if __name__ == "__main__":
+    if not os.path.exists(DOCUMENTS_DIR):
+        os.makedirs(DOCUMENTS_DIR)
+        print(f"Created directory: {DOCUMENTS_DIR}")
+        print(f"Please add your PDF, DOCX, PPTX, or TXT files to the '{DOCUMENTS_DIR}' folder and run the script again.")
+    else:
+        # No Flask session from the command line, so documents go to the anonymous user
+        index_documents(DOCUMENTS_DIR, user_id="anonymous")
+        while True:
+            user_query = input("\nEnter your question (or type 'exit' to quit): ")
+            if user_query.lower() == 'exit':
+                break
+            query_rag(user_query, user_id="anonymous")
@@ -35,6 +35,7 @@ async function uploadFiles() {
             statusMsg.innerText = data.error;
         } else {
             statusMsg.innerText = data.message || 'Upload complete.';
+            if (data.job_id) pollIngestionJob(data.job_id);
             // populate file list from selected files
             addFilesToList(Array.from(fileInput.files));
             fileInput.value = null;
@@ -50,6 +51,40 @@ async function uploadFiles() {
     }
 }
 
+// Poll a background ingestion job and show per-file progress in the status line
+async function pollIngestionJob(jobId) {
+    const statusMsg = document.getElementById('statusMsg');
+    while (true) {
+        let job;
+        try {
+            const res = await fetch(`/jobs/${jobId}`);
+            job = await res.json();
+        } catch (err) {
+            console.error(err);
+            statusMsg.innerText = 'Lost track of indexing job. See console for details.';
+            return;
+        }
+        if (job.error && !job.files) {
+            statusMsg.innerText = job.error;
+            return;
+        }
+        const files = Object.entries(job.files || {});
+        const done = files.filter(([, f]) => ['indexed', 'skipped', 'error'].includes(f.status)).length;
+        const chunks = files.reduce((sum, [, f]) => sum + (f.chunks || 0), 0);
+        const failed = files.filter(([, f]) => f.status === 'error');
+        if (job.status === 'completed' || job.status === 'failed') {
+            let msg = job.status === 'failed'
+                ? `Indexing failed: ${job.error}`
+                : `Indexed ${done} file(s), ${chunks} chunk(s).`;
+            if (failed.length) msg += ' Errors: ' + failed.map(([name, f]) => `${name}: ${f.error}`).join('; ');
+            statusMsg.innerText = msg;
+            return;
+        }
+        statusMsg.innerHTML = `<span class="spinner"></span> Indexing ${done}/${files.length} file(s)...`;
+        await new Promise(resolve => setTimeout(resolve, 1000));
+    }
+}
+
 // Show selected files preview when user picks files (before upload)
 function updateSelectedPreview(fileList){
     const preview = document.getElementById('selectedPreview');
@@ -190,31 +225,43 @@ async function sendQuery() {
     const loadingId = addMessage("Thinking...", 'bot');
 
     try{
-        const res = await fetch('/query', {
+        const res = await fetch('/query/stream', {
             method: 'POST',
             headers: { 'Content-Type': 'application/json' },
             body: JSON.stringify({ query: query })
         });
-        const data = await res.json();
+        if (!res.ok || !res.body) {
+            const data = await res.json();
+            throw new Error(data.message || data.error || res.statusText);
+        }
 
-        // Remove loading message
+        // Render tokens into the loading bubble as they arrive
         const loadingEl = document.getElementById(loadingId);
-        if (loadingEl) loadingEl.remove();
+        let answer = '';
+        let sources = [];
+        await readEventStream(res.body, (event, data) => {
+            if (event === 'sources') {
+                sources = data;
+            } else if (event === 'token') {
+                answer += data;
+                if (loadingEl) loadingEl.innerHTML = formatMessageText(answer);
+                if (history) history.scrollTop = history.scrollHeight;
+            } else if (event === 'done') {
+                answer = data;
+            } else if (event === 'error') {
+                answer = 'Error: ' + data;
+            }
+        });
 
-        if (data.error) {
-            addMessage('Error: ' + data.error, 'bot');
-        } else if (data.file_url) {
-            // show answer and present inline options to Preview/Download/Play
-            const msgId = addMessage(data.answer, 'bot');
-            // append file action buttons into the message bubble
-            const msgEl = document.getElementById(msgId);
-            if (msgEl) {
-                    const actions = createFileActions(data.file_url, data.download_url);
-                    msgEl.appendChild(actions);
-                }
-        } else {
-            // Add bot response and ensure it stays visible
-            addMessage(data.answer, 'bot');
+        // Replace the streaming bubble with the final message (addMessage links any generated files), then list its sources
+        if (loadingEl) loadingEl.remove();
+        const msgId = addMessage(answer, 'bot');
+        const msgEl = document.getElementById(msgId);
+        if (msgEl && sources.length) {
+            const meta = document.createElement('div');
+            meta.className = 'meta';
+            meta.textContent = 'Sources: ' + sources.join(', ');
+            msgEl.appendChild(meta);
         }
         
         // Ensure scroll is at bottom
@@ -227,6 +274,30 @@ async function sendQuery() {
     }
 }
 
+// Parse a text/event-stream response body, calling onEvent(event, data) per message
+async function readEventStream(body, onEvent) {
+    const reader = body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        let sep;
+        while ((sep = buffer.indexOf('\n\n')) !== -1) {
+            const raw = buffer.slice(0, sep);
+            buffer = buffer.slice(sep + 2);
+            let event = 'message';
+            let data = '';
+            for (const line of raw.split('\n')) {
+                if (line.startsWith('event: ')) event = line.slice(7);
+                else if (line.startsWith('data: ')) data += line.slice(6);
+            }
+            onEvent(event, data ? JSON.parse(data) : null);
+        }
+    }
+}
+
 // Create a small actions bar for a file returned by the server
 function createFileActions(previewRel, downloadRel){
     const origin = window.location.origin;
@@ -365,13 +436,8 @@ function sendSpecial(text) {
     sendQuery();
 }
 
-function addMessage(text, sender) {
-    const history = document.getElementById('chatHistory');
-    const div = document.createElement('div');
-    div.classList.add('message', sender);
-    div.id = 'msg-' + Date.now();
-    
-    // Convert markdown formatting to HTML
+// Convert markdown formatting to HTML
+function formatMessageText(text) {
     let formattedText = String(text);
     // Handle **bold** markdown
     formattedText = formattedText.replace(/\*\*([^*]+)\*\*/g, '<strong>$1</strong>');
@@ -383,7 +449,15 @@ function addMessage(text, sender) {
     formattedText = formattedText.replace(/^(\d+)\.\s+/gm, '<strong>$1.</strong> ');
     // Preserve leading * for plain text bullets (do not convert to HTML bullet, just keep as-is)
     // No replacement for ^\*\s+ so that * is preserved in plain text
-    div.innerHTML = formattedText;
+    return formattedText;
+}
+
+function addMessage(text, sender) {
+    const history = document.getElementById('chatHistory');
+    const div = document.createElement('div');
+    div.classList.add('message', sender);
+    div.id = 'msg-' + Date.now();
+    div.innerHTML = formatMessageText(text);
     history.appendChild(div);
     history.scrollTop = history.scrollHeight;
     
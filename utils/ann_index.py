@@ -0,0 +1,103 @@
+import numpy as np
+from datetime import datetime, timezone
+from typing import Optional
+from bson.binary import Binary
+from utils.config import mongo_db
+
+
+class IVFIndex:
+    """Inverted-file ANN index over normalized vectors.
+
+    Vectors are bucketed by their nearest of `n_lists` spherical k-means
+    centroids. A search scores the query against the centroids and returns
+    every row in the `nprobe` closest buckets as the candidate set; raising
+    `nprobe` trades latency for recall.
+    """
+
+    def __init__(self, centroids: np.ndarray, n_trained: int):
+        self.centroids = centroids.astype(np.float32, copy=False)
+        self.n_trained = n_trained
+        self.assignments = np.zeros(0, dtype=np.int32)
+
+    @property
+    def dim(self) -> int:
+        return self.centroids.shape[1]
+
+    @classmethod
+    def train(cls, matrix: np.ndarray, n_lists: int = None, iterations: int = 10,
+              sample_size: int = 50000, seed: int = 0) -> "IVFIndex":
+        rng = np.random.default_rng(seed)
+        n = matrix.shape[0]
+        n_lists = n_lists or max(1, int(np.sqrt(n)))
+        sample = matrix[rng.choice(n, size=min(n, sample_size), replace=False)]
+        centroids = sample[rng.choice(sample.shape[0], size=min(n_lists, sample.shape[0]), replace=False)].copy()
+        for _ in range(iterations):
+            labels = np.argmax(sample @ centroids.T, axis=1)
+            for c in range(centroids.shape[0]):
+                members = sample[labels == c]
+                if len(members):
+                    centroids[c] = members.sum(axis=0)
+            norms = np.linalg.norm(centroids, axis=1, keepdims=True)
+            norms[norms == 0] = 1.0
+            centroids /= norms
+        return cls(centroids, n)
+
+    def assign(self, matrix: np.ndarray) -> np.ndarray:
+        """Returns the bucket of each row."""
+        if matrix.shape[0] == 0:
+            return np.zeros(0, dtype=np.int32)
+        return np.argmax(matrix @ self.centroids.T, axis=1).astype(np.int32)
+
+    def attach(self, matrix: np.ndarray):
+        """Assigns every row of the matrix this index serves."""
+        self.assignments = self.assign(matrix)
+
+    def extend(self, new_rows: np.ndarray) -> "IVFIndex":
+        """Returns a copy that also covers `new_rows`, appended after the existing rows."""
+        extended = IVFIndex(self.centroids, self.n_trained)
+        extended.assignments = np.concatenate([self.assignments, self.assign(new_rows)])
+        return extended
+
+    def search(self, query_unit: np.ndarray, nprobe: int) -> np.ndarray:
+        """Candidate row indices from the `nprobe` buckets nearest the query."""
+        nprobe = min(nprobe, self.centroids.shape[0])
+        probe = np.argpartition(-(self.centroids @ query_unit), nprobe - 1)[:nprobe]
+        return np.flatnonzero(np.isin(self.assignments, probe))
+
+    def is_stale(self, n_rows: int, dim: int) -> bool:
+        """True when the corpus has outgrown the centroids or changed dimension."""
+        return dim != self.dim or n_rows > 4 * self.n_trained
+
+
+class AnnIndexStore:
+    """Persists each user's IVF centroids in MongoDB next to their embeddings.
+
+    Only centroids are stored; bucket assignments are recomputed with one
+    matrix product whenever the user's matrix is loaded.
+    """
+
+    def __init__(self, collection_name: str = "ann_indexes"):
+        self.collection = mongo_db[collection_name]
+
+    def load(self, user_id: str) -> Optional[IVFIndex]:
+        doc = self.collection.find_one({"user_id": user_id})
+        if not doc:
+            return None
+        centroids = np.frombuffer(doc["centroids"], dtype=np.float32).reshape(doc["n_lists"], doc["dim"])
+        return IVFIndex(centroids.copy(), doc["n_trained"])
+
+    def save(self, user_id: str, index: IVFIndex):
+        self.collection.update_one(
+            {"user_id": user_id},
+            {"$set": {
+                "centroids": Binary(index.centroids.tobytes()),
+                "n_lists": index.centroids.shape[0],
+                "dim": index.dim,
+                "n_trained": index.n_trained,
+                "trained_at": datetime.now(timezone.utc),
+            }},
+            upsert=True,
+        )
+
+    def delete(self, user_id: str):
+        self.collection.delete_many({"user_id": user_id})
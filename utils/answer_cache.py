@@ -0,0 +1,110 @@
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Sequence
+import numpy as np
+from utils.config import (ANSWER_CACHE_SIMILARITY, ANSWER_CACHE_TTL_SECONDS,
+                          ANSWER_CACHE_MAX_PER_USER, ANSWER_CACHE_MAX_USERS)
+from utils.retrieval import to_unit_vector
+
+# Words that make a question lean on earlier turns ("what about that one?")
+_FOLLOW_UP = re.compile(
+    r"\b(it|its|that|this|these|those|they|them|their|he|she|his|her|above|previous|"
+    r"earlier|again|more|else|same|former|latter)\b",
+    re.IGNORECASE,
+)
+
+
+def is_context_dependent(query: str, chat_history=None) -> bool:
+    """
+    True when a query's meaning may depend on the conversation so far: there
+    are earlier turns and the query is very short or uses referring words.
+    Such queries bypass the answer cache.
+    """
+    earlier_turns = [t for t in (chat_history or [])[:-1] if t.get("content")]
+    if not earlier_turns:
+        return False
+    return len(query.split()) < 4 or bool(_FOLLOW_UP.search(query))
+
+
+class SemanticAnswerCache:
+    """Per-user cache of answers keyed by query embedding and corpus version.
+
+    A lookup hits when a stored query for the same user has cosine similarity
+    of at least `threshold`, was answered against the same corpus version, and
+    is younger than `ttl_seconds`. Users are evicted LRU beyond `max_users`;
+    each user keeps at most `max_per_user` answers.
+    """
+
+    def __init__(self, threshold: float = ANSWER_CACHE_SIMILARITY, ttl_seconds: float = ANSWER_CACHE_TTL_SECONDS,
+                 max_per_user: int = ANSWER_CACHE_MAX_PER_USER, max_users: int = ANSWER_CACHE_MAX_USERS):
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_per_user = max_per_user
+        self.max_users = max_users
+        self._users = OrderedDict()  # user_id -> list of entry dicts, oldest first
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.bypasses = 0
+
+    def record_bypass(self):
+        with self._lock:
+            self.bypasses += 1
+
+    def get(self, user_id: str, query_embedding: Sequence[float], corpus_version: int) -> Optional[Dict]:
+        query = to_unit_vector(query_embedding)
+        now = time.monotonic()
+        with self._lock:
+            entries = self._users.get(user_id, [])
+            entries[:] = [e for e in entries
+                          if e["version"] == corpus_version and now - e["created"] <= self.ttl_seconds]
+            best, best_sim = None, self.threshold
+            if entries:
+                sims = np.stack([e["vector"] for e in entries]) @ query
+                idx = int(np.argmax(sims))
+                if sims[idx] >= best_sim:
+                    best, best_sim = entries[idx], float(sims[idx])
+            if best is None:
+                self.misses += 1
+                return None
+            self._users.move_to_end(user_id)
+            self.hits += 1
+            return {"answer": best["answer"], "sources": best["sources"], "similarity": best_sim}
+
+    def put(self, user_id: str, query_embedding: Sequence[float], corpus_version: int,
+            answer: str, sources: List[str]):
+        entry = {
+            "vector": to_unit_vector(query_embedding),
+            "version": corpus_version,
+            "created": time.monotonic(),
+            "answer": answer,
+            "sources": sources,
+        }
+        with self._lock:
+            entries = self._users.setdefault(user_id, [])
+            entries.append(entry)
+            del entries[:-self.max_per_user]
+            self._users.move_to_end(user_id)
+            while len(self._users) > self.max_users:
+                self._users.popitem(last=False)
+
+    def invalidate(self, user_id: str):
+        with self._lock:
+            self._users.pop(user_id, None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "users": len(self._users),
+                "entries": sum(len(e) for e in self._users.values()),
+                "hits": self.hits,
+                "misses": self.misses,
+                "bypasses": self.bypasses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+answer_cache = SemanticAnswerCache()
@@ -0,0 +1,14 @@
+"""Creates manifest (document listing) entries for documents indexed before the manifest existed.
+
+Usage: python -m utils.backfill_documents
+"""
+from utils.config import DOCUMENTS_DIR
+from utils.ingestion_manifest import IngestionManifest
+from utils.mongo_embedding_store import MongoEmbeddingStore
+
+
+if __name__ == "__main__":
+    manifest = IngestionManifest()
+    manifest.ensure_indexes()
+    created = manifest.backfill(MongoEmbeddingStore().collection, DOCUMENTS_DIR)
+    print(f"Created {created} document entr{'y' if created == 1 else 'ies'}")
@@ -0,0 +1,164 @@
+import errno
+import hashlib
+import os
+import re
+import tempfile
+import threading
+import uuid
+from typing import BinaryIO, Optional, Tuple
+from utils.config import BLOB_STORE_DIR
+from utils.ingestion_manifest import file_sha256
+
+_UNSAFE = re.compile(r"[^A-Za-z0-9_.-]")
+# link() errors meaning the filesystem cannot hard-link, so symlinks are used instead
+_NO_HARD_LINKS = (errno.EXDEV, errno.EPERM, errno.ENOTSUP)
+
+
+class BlobStore:
+    """Content-addressed storage for uploaded files.
+
+    Each distinct content is stored once as blobs/<sha[:2]>/<sha>, written
+    in a single streaming pass that also computes the SHA-256. A user's
+    files are hard links users/<user>/<filename> to their blobs, so the
+    per-user directory is an ordinary folder that index_documents reads and
+    users uploading the same file share one copy on disk. A blob is removed
+    when its last user link goes. Across worker processes, an upload's temp
+    file stays linked to its blob until the user link exists, and a blob
+    collected by another worker mid-upload is recreated from it. On
+    filesystems without hard links the user links are symlinks, and blobs
+    are never garbage-collected.
+    """
+
+    def __init__(self, root: str = BLOB_STORE_DIR):
+        self.root = os.path.abspath(root)
+        self.blobs_dir = os.path.join(self.root, "blobs")
+        self.users_dir = os.path.join(self.root, "users")
+        self.tmp_dir = os.path.join(self.root, "tmp")
+        for path in (self.blobs_dir, self.users_dir, self.tmp_dir):
+            os.makedirs(path, exist_ok=True)
+        # Serializes linking against garbage collection of the same blob
+        self._lock = threading.Lock()
+
+    def blob_path(self, content_hash: str) -> str:
+        return os.path.join(self.blobs_dir, content_hash[:2], content_hash)
+
+    def user_dir(self, user_id: str) -> str:
+        path = os.path.join(self.users_dir, _UNSAFE.sub("_", user_id) or "anonymous")
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    def user_path(self, user_id: str, name: str) -> Optional[str]:
+        path = os.path.join(self.user_dir(user_id), name)
+        return path if os.path.isfile(path) else None
+
+    def store(self, user_id: str, name: str, stream: BinaryIO, block_size: int = 1 << 20) -> Tuple[str, int]:
+        """
+        Streams `stream` into the store and links it as the user's file `name`
+        (replacing any previous file of that name). Returns (sha256, size).
+        """
+        digest = hashlib.sha256()
+        size = 0
+        fd, tmp_path = tempfile.mkstemp(dir=self.tmp_dir)
+        try:
+            with os.fdopen(fd, "wb") as out:
+                for block in iter(lambda: stream.read(block_size), b""):
+                    digest.update(block)
+                    out.write(block)
+                    size += len(block)
+            content_hash = digest.hexdigest()
+            blob = self.blob_path(content_hash)
+            os.makedirs(os.path.dirname(blob), exist_ok=True)
+            with self._lock:
+                self._link(user_id, name, blob, tmp_path)
+        finally:
+            if os.path.exists(tmp_path):
+                # The user's link now holds the content: the streamed copy is dropped
+                os.remove(tmp_path)
+        return content_hash, size
+
+    @staticmethod
+    def _create_blob(source: str, blob: str):
+        try:
+            # While `source` exists the blob has two links, so a _collect in
+            # another worker process leaves it alone until the user link exists
+            os.link(source, blob)
+        except FileExistsError:
+            pass
+        except OSError as e:
+            if e.errno not in _NO_HARD_LINKS:
+                raise
+            os.replace(source, blob)
+
+    def _link(self, user_id: str, name: str, blob: str, source: str):
+        dest = os.path.join(self.user_dir(user_id), name)
+        previous = os.lstat(dest) if os.path.lexists(dest) else None
+        staged = f"{dest}.{uuid.uuid4().hex}.tmp"
+        while True:
+            if not os.path.exists(blob):
+                self._create_blob(source, blob)
+            try:
+                os.link(blob, staged)
+                break
+            except FileNotFoundError:
+                # Another worker collected the blob after the check; recreate it from `source`
+                if os.path.exists(blob) or not os.path.exists(source):
+                    raise
+            except OSError as e:
+                if e.errno not in _NO_HARD_LINKS:
+                    raise
+                os.symlink(blob, staged)
+                break
+        replaced_hash = None
+        if previous is not None and previous.st_nlink == 2 and previous.st_ino != os.stat(blob).st_ino:
+            # The replaced file was the last link to its blob
+            replaced_hash = file_sha256(dest)
+        os.replace(staged, dest)
+        if replaced_hash:
+            self._collect(replaced_hash)
+
+    def _collect(self, content_hash: str):
+        blob = self.blob_path(content_hash)
+        try:
+            if os.stat(blob).st_nlink == 1:
+                os.remove(blob)
+        except FileNotFoundError:
+            pass
+
+    def unlink(self, user_id: str, name: str, content_hash: str = None) -> bool:
+        """
+        Removes the user's file `name`, and its blob if no other link remains.
+        `content_hash` (e.g. from the ingestion manifest) saves re-hashing the
+        file to find the blob. Returns False if the user had no such file.
+        """
+        path = os.path.join(self.user_dir(user_id), name)
+        with self._lock:
+            if not os.path.lexists(path):
+                return False
+            st = os.lstat(path)
+            if st.st_nlink == 2:
+                # A stale hint (file replaced since it was indexed) must not collect another blob
+                blob = self.blob_path(content_hash) if content_hash else None
+                if blob is None or not os.path.exists(blob) or os.stat(blob).st_ino != st.st_ino:
+                    content_hash = file_sha256(path)
+            os.remove(path)
+            if st.st_nlink == 2:
+                self._collect(content_hash)
+        return True
+
+    def clear_user(self, user_id: str):
+        folder = self.user_dir(user_id)
+        for name in os.listdir(folder):
+            self.unlink(user_id, name)
+
+
+_shared_store: Optional[BlobStore] = None
+_shared_lock = threading.Lock()
+
+
+def get_blob_store() -> BlobStore:
+    """Returns the process-wide blob store, creating its directories on first use."""
+    global _shared_store
+    with _shared_lock:
+        if _shared_store is None:
+            _shared_store = BlobStore()
+        return _shared_store
@@ -0,0 +1,208 @@
+import copy
+import threading
+import uuid
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Callable, Dict, List
+from utils.config import (CHAT_HISTORY_BACKEND, CHAT_HISTORY_MAX_TURNS, CHAT_HISTORY_KEEP_TURNS,
+                          CHAT_HISTORY_MAX_CONVERSATIONS, CHAT_HISTORY_TTL_SECONDS)
+
+# Turns kept per conversation even if summarization keeps failing
+_MAX_STORED_TURNS = 4 * CHAT_HISTORY_MAX_TURNS
+
+
+def _new_conversation() -> Dict:
+    return {"summary": "", "summary_version": 0, "turns": []}
+
+
+def _new_turns(turns: List[Dict]) -> List[Dict]:
+    # Turns get ids so compaction can drop exactly the turns it summarized
+    return [{"id": uuid.uuid4().hex, "role": t["role"], "content": t["content"]} for t in turns]
+
+
+class InMemoryChatHistoryStore:
+    """Keeps conversations in an LRU dict; suitable for a single worker process and for tests."""
+
+    def __init__(self, max_conversations: int = CHAT_HISTORY_MAX_CONVERSATIONS):
+        self.max_conversations = max_conversations
+        self._conversations = OrderedDict()
+        self._lock = threading.Lock()
+
+    def load(self, user_id: str, conversation_id: str) -> Dict:
+        with self._lock:
+            conversation = self._conversations.get((user_id, conversation_id))
+            if conversation is None:
+                return _new_conversation()
+            self._conversations.move_to_end((user_id, conversation_id))
+            return copy.deepcopy(conversation)
+
+    def append(self, user_id: str, conversation_id: str, turns: List[Dict]):
+        key = (user_id, conversation_id)
+        with self._lock:
+            conversation = self._conversations.setdefault(key, _new_conversation())
+            conversation["turns"].extend(_new_turns(turns))
+            del conversation["turns"][:-_MAX_STORED_TURNS]
+            self._conversations.move_to_end(key)
+            while len(self._conversations) > self.max_conversations:
+                self._conversations.popitem(last=False)
+
+    def compact(self, user_id: str, conversation_id: str, summary: str, turn_ids: List[str],
+                expected_version: int) -> bool:
+        """Replaces the summary and drops `turn_ids`, unless another compaction got there first."""
+        with self._lock:
+            conversation = self._conversations.get((user_id, conversation_id))
+            if conversation is None or conversation["summary_version"] != expected_version:
+                return False
+            dropped = set(turn_ids)
+            conversation["turns"] = [t for t in conversation["turns"] if t["id"] not in dropped]
+            conversation["summary"] = summary
+            conversation["summary_version"] += 1
+            return True
+
+    def clear(self, user_id: str, conversation_id: str = None):
+        with self._lock:
+            for key in [k for k in self._conversations if k[0] == user_id]:
+                if conversation_id is None or key[1] == conversation_id:
+                    del self._conversations[key]
+
+    def ensure_indexes(self):
+        pass
+
+
+class MongoChatHistoryStore:
+    """Keeps one document per conversation in MongoDB so any gunicorn worker can continue it."""
+
+    def __init__(self, collection_name: str = "chat_history"):
+        from utils.config import mongo_db
+        self.collection = mongo_db[collection_name]
+
+    @staticmethod
+    def _key(user_id: str, conversation_id: str) -> str:
+        return f"{user_id}:{conversation_id}"
+
+    def load(self, user_id: str, conversation_id: str) -> Dict:
+        doc = self.collection.find_one({"_id": self._key(user_id, conversation_id)},
+                                       {"summary": 1, "summary_version": 1, "turns": 1})
+        if doc is None:
+            return _new_conversation()
+        doc.pop("_id")
+        return doc
+
+    def append(self, user_id: str, conversation_id: str, turns: List[Dict]):
+        self.collection.update_one(
+            {"_id": self._key(user_id, conversation_id)},
+            {
+                "$push": {"turns": {"$each": _new_turns(turns), "$slice": -_MAX_STORED_TURNS}},
+                "$set": {"updated_at": datetime.now(timezone.utc)},
+                "$setOnInsert": {"user_id": user_id, "conversation_id": conversation_id,
+                                 "summary": "", "summary_version": 0},
+            },
+            upsert=True,
+        )
+
+    def compact(self, user_id: str, conversation_id: str, summary: str, turn_ids: List[str],
+                expected_version: int) -> bool:
+        result = self.collection.update_one(
+            {"_id": self._key(user_id, conversation_id), "summary_version": expected_version},
+            {
+                "$set": {"summary": summary},
+                "$inc": {"summary_version": 1},
+                "$pull": {"turns": {"id": {"$in": turn_ids}}},
+            },
+        )
+        return result.matched_count == 1
+
+    def clear(self, user_id: str, conversation_id: str = None):
+        query = {"user_id": user_id}
+        if conversation_id:
+            query["conversation_id"] = conversation_id
+        self.collection.delete_many(query)
+
+    def ensure_indexes(self):
+        self.collection.create_index([("user_id", 1)])
+        # Idle conversations expire instead of accumulating forever
+        self.collection.create_index([("updated_at", 1)], expireAfterSeconds=CHAT_HISTORY_TTL_SECONDS)
+
+
+def create_chat_history_store(backend: str = CHAT_HISTORY_BACKEND):
+    if backend == "mongo":
+        return MongoChatHistoryStore()
+    return InMemoryChatHistoryStore()
+
+
+class ChatHistory:
+    """Server-side conversation history with a rolling summary.
+
+    The prompt sees the running summary (as a leading "summary" turn) and
+    the turns since, so its size stays bounded however long the
+    conversation gets. When a conversation passes `max_turns` stored turns,
+    all but the newest `keep_turns` are folded into the summary by
+    `summarize(previous_summary, turns)`. Compaction runs on `executor` off
+    the request path; until it lands, ContextPacker's history budget still
+    bounds the prompt.
+    """
+
+    def __init__(self, store, summarize: Callable[[str, List[Dict]], str], executor=None,
+                 max_turns: int = CHAT_HISTORY_MAX_TURNS, keep_turns: int = CHAT_HISTORY_KEEP_TURNS):
+        self.store = store
+        self.summarize = summarize
+        self.executor = executor
+        self.max_turns = max_turns
+        self.keep_turns = keep_turns
+        self._compacting = set()
+        self._lock = threading.Lock()
+
+    def get(self, user_id: str, conversation_id: str) -> List[Dict]:
+        """Prompt-ready history, oldest first: the summary (if any), then the recent turns."""
+        conversation = self.store.load(user_id, conversation_id)
+        history = [{"role": t["role"], "content": t["content"]} for t in conversation["turns"]]
+        if conversation["summary"]:
+            history.insert(0, {"role": "summary", "content": conversation["summary"]})
+        return history
+
+    def add_exchange(self, user_id: str, conversation_id: str, query: str, answer: str):
+        self.store.append(user_id, conversation_id, [
+            {"role": "user", "content": query},
+            {"role": "assistant", "content": answer},
+        ])
+        self._maybe_compact(user_id, conversation_id)
+
+    def clear(self, user_id: str, conversation_id: str = None):
+        self.store.clear(user_id, conversation_id)
+
+    def _maybe_compact(self, user_id: str, conversation_id: str):
+        key = (user_id, conversation_id)
+        with self._lock:
+            if key in self._compacting:
+                return
+            self._compacting.add(key)
+        try:
+            if self.executor is None:
+                self._compact_and_release(key)
+            else:
+                self.executor.submit(self._compact_and_release, key)
+        except Exception:
+            with self._lock:
+                self._compacting.discard(key)
+            raise
+
+    def _compact_and_release(self, key):
+        try:
+            self.compact(*key)
+        except Exception as e:
+            # The turns stay as they are; the next exchange retries
+            print(f"Chat history compaction failed for {key[0]}: {e}")
+        finally:
+            with self._lock:
+                self._compacting.discard(key)
+
+    def compact(self, user_id: str, conversation_id: str) -> bool:
+        """Folds the older turns into the summary if the conversation is over `max_turns`."""
+        conversation = self.store.load(user_id, conversation_id)
+        turns = conversation["turns"]
+        if len(turns) <= self.max_turns:
+            return False
+        folded = turns[:len(turns) - self.keep_turns]
+        summary = self.summarize(conversation["summary"], folded)
+        return self.store.compact(user_id, conversation_id, summary, [t["id"] for t in folded],
+                                  conversation["summary_version"])
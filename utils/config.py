@@ -8,7 +8,7 @@ GEMINI_API_KEY = os.getenv("GOOGLE_API_KEY")
 
 GEMINI_MODEL_NAME = "gemini-2.5-flash"
 
-EMBEDDING_MODEL_NAME="embedding-001"
+EMBEDDING_MODEL_NAME = os.getenv('EMBEDDING_MODEL_NAME', "embedding-001")
 
 DOCUMENTS_DIR = "./documents"
 
@@ -26,4 +26,79 @@ mongo_client = MongoClient(
     connectTimeoutMS=5000,
     socketTimeoutMS=5000
 )
-mongo_db = mongo_client[MONGO_DB_NAME]
\ No newline at end of file
+mongo_db = mongo_client[MONGO_DB_NAME]
+
+# In-process cache of per-user embedding matrices used at query time
+EMBEDDING_CACHE_MAX_USERS = int(os.getenv('EMBEDDING_CACHE_MAX_USERS', 64))
+EMBEDDING_CACHE_MAX_BYTES = int(os.getenv('EMBEDDING_CACHE_MAX_BYTES', 512 * 1024 * 1024))
+EMBEDDING_CACHE_TTL_SECONDS = float(os.getenv('EMBEDDING_CACHE_TTL_SECONDS', 300))
+
+# Embedding API batching
+EMBEDDING_BATCH_SIZE = int(os.getenv('EMBEDDING_BATCH_SIZE', 100))
+EMBEDDING_MAX_WORKERS = int(os.getenv('EMBEDDING_MAX_WORKERS', 4))
+EMBEDDING_MAX_RETRIES = int(os.getenv('EMBEDDING_MAX_RETRIES', 5))
+
+# Persistent content-addressed cache of text embeddings (shared across users)
+TEXT_EMBEDDING_CACHE_PATH = os.getenv('TEXT_EMBEDDING_CACHE_PATH', './embedding_cache.sqlite3')
+TEXT_EMBEDDING_CACHE_MAX_ENTRIES = int(os.getenv('TEXT_EMBEDDING_CACHE_MAX_ENTRIES', 200000))
+
+# Approximate nearest-neighbour (IVF) retrieval; smaller corpora use exact search
+ANN_MIN_CHUNKS = int(os.getenv('ANN_MIN_CHUNKS', 5000))
+ANN_NPROBE = int(os.getenv('ANN_NPROBE', 8))
+
+# Background ingestion: worker threads per process and job store backend
+# ('mongo', shared by all gunicorn workers, or 'memory' for tests)
+INGEST_WORKERS = int(os.getenv('INGEST_WORKERS', 2))
+JOB_STORE_BACKEND = os.getenv('JOB_STORE_BACKEND', 'mongo')
+
+# Processes used for document extraction/chunking during indexing (1 = inline)
+EXTRACT_WORKERS = int(os.getenv('EXTRACT_WORKERS', os.cpu_count() or 1))
+
+# How new embeddings are stored in MongoDB: 'list', 'float32' or 'int8' (see utils/vector_codec.py)
+EMBEDDING_STORAGE_FORMAT = os.getenv('EMBEDDING_STORAGE_FORMAT', 'float32')
+
+# Semantic answer cache: reuse an answer for a near-duplicate question on an unchanged corpus
+ANSWER_CACHE_SIMILARITY = float(os.getenv('ANSWER_CACHE_SIMILARITY', 0.95))
+ANSWER_CACHE_TTL_SECONDS = float(os.getenv('ANSWER_CACHE_TTL_SECONDS', 3600))
+ANSWER_CACHE_MAX_PER_USER = int(os.getenv('ANSWER_CACHE_MAX_PER_USER', 256))
+ANSWER_CACHE_MAX_USERS = int(os.getenv('ANSWER_CACHE_MAX_USERS', 1000))
+
+# Hybrid retrieval: BM25 and dense rankings fused with reciprocal rank fusion before MMR
+HYBRID_RETRIEVAL = os.getenv('HYBRID_RETRIEVAL', 'true').lower() == 'true'
+HYBRID_CANDIDATES = int(os.getenv('HYBRID_CANDIDATES', 100))
+RRF_K = int(os.getenv('RRF_K', 60))
+
+# Prompt size limits (estimated tokens) for retrieved context and chat history
+CONTEXT_TOKEN_BUDGET = int(os.getenv('CONTEXT_TOKEN_BUDGET', 3000))
+HISTORY_TOKEN_BUDGET = int(os.getenv('HISTORY_TOKEN_BUDGET', 800))
+
+# Query-time I/O: pool for concurrent stages and per-stage timeouts (seconds)
+QUERY_WORKERS = int(os.getenv('QUERY_WORKERS', 16))
+QUERY_EMBED_TIMEOUT = float(os.getenv('QUERY_EMBED_TIMEOUT', 15))
+QUERY_FETCH_TIMEOUT = float(os.getenv('QUERY_FETCH_TIMEOUT', 15))
+QUERY_GENERATE_TIMEOUT = float(os.getenv('QUERY_GENERATE_TIMEOUT', 60))
+
+# Server-side chat history: store backend ('mongo', shared by all gunicorn workers, or
+# 'memory' for tests) and rolling summarization.
+# Once a conversation has more than CHAT_HISTORY_MAX_TURNS stored turns, all but the
+# newest CHAT_HISTORY_KEEP_TURNS are folded into a summary of at most CHAT_SUMMARY_TOKEN_BUDGET tokens
+CHAT_HISTORY_BACKEND = os.getenv('CHAT_HISTORY_BACKEND', 'mongo')
+CHAT_HISTORY_MAX_TURNS = int(os.getenv('CHAT_HISTORY_MAX_TURNS', 12))
+CHAT_HISTORY_KEEP_TURNS = int(os.getenv('CHAT_HISTORY_KEEP_TURNS', 6))
+CHAT_SUMMARY_TOKEN_BUDGET = int(os.getenv('CHAT_SUMMARY_TOKEN_BUDGET', 300))
+CHAT_HISTORY_MAX_CONVERSATIONS = int(os.getenv('CHAT_HISTORY_MAX_CONVERSATIONS', 10000))
+CHAT_HISTORY_TTL_SECONDS = int(os.getenv('CHAT_HISTORY_TTL_SECONDS', 30 * 24 * 3600))
+
+# Batch queries (/query/batch): questions per request and concurrent Gemini generations per batch
+QUERY_BATCH_MAX_QUERIES = int(os.getenv('QUERY_BATCH_MAX_QUERIES', 500))
+QUERY_BATCH_CONCURRENCY = int(os.getenv('QUERY_BATCH_CONCURRENCY', 8))
+
+# Embedding backend: 'gemini' (embedding API) or 'local' (sentence-transformers model on the CPU).
+# The local model is loaded from EMBEDDING_LOCAL_MODEL_PATH once per worker process
+EMBEDDING_BACKEND = os.getenv('EMBEDDING_BACKEND', 'gemini')
+EMBEDDING_LOCAL_MODEL_PATH = os.getenv('EMBEDDING_LOCAL_MODEL_PATH', './models/all-MiniLM-L6-v2')
+EMBEDDING_LOCAL_BATCH_SIZE = int(os.getenv('EMBEDDING_LOCAL_BATCH_SIZE', 32))
+EMBEDDING_LOCAL_THREADS = int(os.getenv('EMBEDDING_LOCAL_THREADS', os.cpu_count() or 1))
+
+# Content-addressed upload storage: blobs plus per-user hard links (see utils/blob_store.py)
+BLOB_STORE_DIR = os.getenv('BLOB_STORE_DIR', './blob_store')
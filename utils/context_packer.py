@@ -0,0 +1,123 @@
+from typing import Dict, List, Optional, Tuple
+from utils.config import CONTEXT_TOKEN_BUDGET, HISTORY_TOKEN_BUDGET
+
+# Overlap prefixes are at most chunk_overlap (<= 120) characters; search a little beyond
+_MAX_OVERLAP_SEARCH = 1000
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough Gemini token count (about four characters per token); avoids a count_tokens round trip."""
+    return (len(text) + 3) // 4
+
+
+def _chunk_position(chunk: Dict) -> Tuple[Optional[str], Optional[int]]:
+    """(source, ordinal) from a chunk id like "manual.pdf_chunk_12", or (None, None)."""
+    chunk_id = chunk.get("chunk_id") or ""
+    source, sep, ordinal = chunk_id.rpartition("_chunk_")
+    if not sep or not ordinal.isdigit():
+        return None, None
+    return source, int(ordinal)
+
+
+def strip_overlap(previous: str, text: str) -> str:
+    """
+    Removes the overlap TextChunker prepends to a chunk: a tail of the
+    previous chunk followed by a blank line. Returns `text` unchanged if it
+    does not start with such a tail.
+    """
+    end = text.find("\n\n", 0, _MAX_OVERLAP_SEARCH)
+    best = -1
+    while end != -1:
+        if previous.endswith(text[:end]):
+            best = end
+        end = text.find("\n\n", end + 1, _MAX_OVERLAP_SEARCH)
+    return text[best + 2:] if best > 0 else text
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    limit = max_tokens * 4
+    if len(text) <= limit:
+        return text
+    cut = text.rfind(" ", 0, limit)
+    return text[:cut if cut > 0 else limit] + " ..."
+
+
+class ContextPacker:
+    """Fits retrieved chunks and chat history into token budgets for the prompt.
+
+    Chunks arrive in relevance order (MMR pick order). Chunks that are
+    adjacent in the same source are merged into one passage with their
+    duplicated overlap removed, exact duplicates are dropped, and passages
+    are added best-first while they fit `context_budget` tokens. The best
+    passage is always included, truncated if necessary. History keeps the
+    most recent turns that fit `history_budget`.
+    """
+
+    def __init__(self, context_budget: int = CONTEXT_TOKEN_BUDGET, history_budget: int = HISTORY_TOKEN_BUDGET,
+                 max_history_turns: int = 10):
+        self.context_budget = context_budget
+        self.history_budget = history_budget
+        self.max_history_turns = max_history_turns
+
+    def merge_adjacent(self, chunks: List[Dict]) -> List[str]:
+        """Passages in order of their best-ranked chunk."""
+        passages = []  # [best_rank, source, last_ordinal, text]
+        by_position = {}
+        for rank, chunk in enumerate(chunks):
+            source, ordinal = _chunk_position(chunk)
+            if source is not None:
+                by_position[(source, ordinal)] = (rank, chunk["text"])
+            else:
+                passages.append([rank, None, None, chunk["text"]])
+        for (source, ordinal), (rank, text) in sorted(by_position.items()):
+            last = passages[-1] if passages else None
+            if last and last[1] == source and last[2] == ordinal - 1:
+                last[0] = min(last[0], rank)
+                last[2] = ordinal
+                last[3] += "\n\n" + strip_overlap(last[3], text)
+            else:
+                passages.append([rank, source, ordinal, text])
+        passages.sort(key=lambda p: p[0])
+        return [p[3] for p in passages]
+
+    def pack_context(self, chunks: List[Dict]) -> List[str]:
+        packed, seen = [], set()
+        remaining = self.context_budget
+        for passage in self.merge_adjacent(chunks):
+            if passage in seen:
+                continue
+            seen.add(passage)
+            tokens = estimate_tokens(passage)
+            if tokens <= remaining:
+                packed.append(passage)
+                remaining -= tokens
+            elif not packed:
+                packed.append(truncate_to_tokens(passage, remaining))
+                remaining = 0
+        return packed
+
+    def pack_history(self, chat_history: List[Dict], query: str = None) -> List[Dict]:
+        """
+        The most recent turns within budget, oldest first. The current query
+        is not repeated. A leading "summary" turn (see utils.chat_history) is
+        always kept, truncated to at most half the budget.
+        """
+        turns = list(chat_history or [])
+        if turns and query is not None and turns[-1].get("role") == "user" and turns[-1].get("content") == query:
+            turns = turns[:-1]
+        remaining = self.history_budget
+        summary = None
+        if turns and turns[0].get("role") == "summary":
+            content = truncate_to_tokens(turns.pop(0).get("content", ""), self.history_budget // 2)
+            summary = {"role": "summary", "content": content}
+            remaining -= estimate_tokens(content) + 2
+        kept = []
+        for turn in reversed(turns[-self.max_history_turns:]):
+            tokens = estimate_tokens(turn.get("content", "")) + 2
+            if tokens > remaining:
+                break
+            kept.append(turn)
+            remaining -= tokens
+        if summary:
+            kept.append(summary)
+        return kept[::-1]
@@ -1,6 +1,8 @@
 from flask import Blueprint, request, jsonify, session
+from werkzeug.utils import secure_filename
 import os
-from utils.mongo_embedding_store import MongoEmbeddingStore
+from utils.services import get_services
+from utils.blob_store import get_blob_store
 from utils.config import DOCUMENTS_DIR
 
 bp = Blueprint('delete', __name__)
@@ -8,32 +10,57 @@ bp = Blueprint('delete', __name__)
 @bp.route('/delete_file', methods=['POST'])
 def delete_file():
     user_id = session.get('user_id', 'anonymous')
-    mongo_store = MongoEmbeddingStore()
-    # Retrieve all document embeddings for the user
-    user_docs = mongo_store.get_user_embeddings(user_id)
-    if not user_docs:
+    mongo_store = get_services().embedding_store
+    manifest = get_services().manifest
+    data = request.get_json(silent=True) or {}
+    filename = secure_filename(data.get('filename') or '')
+    # Document ids come from the manifest (one record per document), never from the chunks
+    known = {doc['doc_id']: doc.get('content_hash') for doc in manifest.list_documents(user_id)}
+    if filename:
+        doc_ids = [filename]
+    else:
+        doc_ids = sorted(known)
+    if not doc_ids:
         return jsonify({'error': 'No files found for user'}), 404
 
     removed = False
     errors = []
     deleted_files = []
-    # Get unique doc_ids (filenames) for the user
-    doc_ids = set(doc['doc_id'] for doc in user_docs if 'doc_id' in doc)
-    for filename in doc_ids:
+    for doc_id in doc_ids:
+        found = doc_id in known
+        try:
+            # The manifest's hash locates the blob without re-reading the file
+            if get_blob_store().unlink(user_id, doc_id, known.get(doc_id)):
+                found = True
+        except Exception as e:
+            errors.append(f"Failed to delete file {doc_id}: {str(e)}")
+        # Files uploaded before the blob store
         for folder in [os.path.join(os.getcwd(), 'uploads'), DOCUMENTS_DIR]:
-            path = os.path.join(folder, filename)
+            path = os.path.join(folder, doc_id)
             if os.path.exists(path):
                 try:
                     os.remove(path)
-                    removed = True
-                    deleted_files.append(filename)
+                    found = True
                 except Exception as e:
-                    errors.append(f"Failed to delete file {filename}: {str(e)}")
-        # Delete embeddings for this file
+                    errors.append(f"Failed to delete file {doc_id}: {str(e)}")
+        if filename:
+            # Single document: indexed delete of its chunks and manifest record
+            try:
+                mongo_store.delete_document_embeddings(user_id, doc_id)
+                manifest.remove(user_id, doc_id)
+            except Exception as e:
+                errors.append(f"Failed to delete embeddings for {doc_id}: {str(e)}")
+        if found:
+            removed = True
+            deleted_files.append(doc_id)
+
+    if not filename:
+        # Whole library: one delete_many per collection instead of one per document
         try:
-            mongo_store.delete_document_embeddings(user_id, filename)
+            mongo_store.clear_user_embeddings(user_id)
+            manifest.remove(user_id)
         except Exception as e:
-            errors.append(f"Failed to delete embeddings for {filename}: {str(e)}")
+            errors.append(f"Failed to delete embeddings: {str(e)}")
 
     if removed:
         return jsonify({'status': 'deleted', 'files': deleted_files, 'errors': errors}), 200
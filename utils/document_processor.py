@@ -2,17 +2,71 @@ import os
 from PyPDF2 import PdfReader
 from docx import Document
 from pptx import Presentation
-from typing import List, Dict
+from typing import List, Dict, Iterator
 
 class DocumentProcessor:
+    # --- Streaming extractors: yield {"text", "location"} segments one at a time ---
+
+    @staticmethod
+    def iter_pdf_segments(file_path: str) -> Iterator[Dict]:
+        reader = PdfReader(file_path)
+        for page_number, page in enumerate(reader.pages, start=1):
+            yield {"text": page.extract_text() or "", "location": {"page": page_number}}
+
+    @staticmethod
+    def iter_docx_segments(file_path: str) -> Iterator[Dict]:
+        doc = Document(file_path)
+        for index, para in enumerate(doc.paragraphs, start=1):
+            yield {"text": para.text, "location": {"paragraph": index}}
+
+    @staticmethod
+    def iter_pptx_segments(file_path: str) -> Iterator[Dict]:
+        prs = Presentation(file_path)
+        for slide_number, slide in enumerate(prs.slides, start=1):
+            texts = [shape.text for shape in slide.shapes if hasattr(shape, "text")]
+            yield {"text": "\n".join(texts), "location": {"slide": slide_number}}
+
+    @staticmethod
+    def iter_txt_segments(file_path: str) -> Iterator[Dict]:
+        """Yields blank-line separated blocks without reading the whole file."""
+        with open(file_path, 'r', encoding='utf-8') as f:
+            lines, start = [], 1
+            for line_number, line in enumerate(f, start=1):
+                if line.strip():
+                    if not lines:
+                        start = line_number
+                    lines.append(line.rstrip("\n"))
+                elif lines:
+                    yield {"text": "\n".join(lines), "location": {"line": start}}
+                    lines = []
+            if lines:
+                yield {"text": "\n".join(lines), "location": {"line": start}}
+
+    def iter_segments(self, file_path: str) -> Iterator[Dict]:
+        """
+        Streams a document as located text segments (PDF pages, DOCX paragraphs,
+        PPTX slides, TXT blocks). Returns None for unsupported file types. Read
+        errors are raised to the consumer, so a file that fails partway through
+        is reported as failed rather than indexed as truncated.
+        """
+        file_extension = os.path.splitext(file_path)[1].lower()
+        reader = {
+            '.pdf': self.iter_pdf_segments,
+            '.docx': self.iter_docx_segments,
+            '.pptx': self.iter_pptx_segments,
+            '.txt': self.iter_txt_segments,
+        }.get(file_extension)
+        if reader is None:
+            print(f"Unsupported file type: {file_extension}")
+            return None
+        return reader(file_path)
+
+    # --- Whole-text extractors ---
+
     @staticmethod
     def extract_text_from_pdf(file_path: str) -> str:
         try:
-            reader = PdfReader(file_path)
-            text = ""
-            for page in reader.pages:
-                text += page.extract_text() or ""
-            return text
+            return "".join(seg["text"] for seg in DocumentProcessor.iter_pdf_segments(file_path))
         except Exception as e:
             print(f"Error reading PDF {file_path}: {e}")
             return ""
@@ -31,12 +85,7 @@ class DocumentProcessor:
     def extract_text_from_pptx(file_path: str) -> str:
         try:
             prs = Presentation(file_path)
-            text = ""
-            for slide in prs.slides:
-                for shape in slide.shapes:
-                    if hasattr(shape, "text"):
-                        text += shape.text + "\n"
-            return text
+            return "".join(shape.text + "\n" for slide in prs.slides for shape in slide.shapes if hasattr(shape, "text"))
         except Exception as e:
             print(f"Error reading PPTX {file_path}: {e}")
             return ""
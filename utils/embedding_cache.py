@@ -0,0 +1,112 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+from utils.config import EMBEDDING_CACHE_MAX_USERS, EMBEDDING_CACHE_MAX_BYTES, EMBEDDING_CACHE_TTL_SECONDS
+from utils.retrieval import EmbeddingMatrix
+
+
+class UserEmbeddingCache:
+    """Process-level LRU cache of decoded embedding matrices keyed by user_id.
+
+    Each entry remembers the corpus version it was loaded at and is only
+    served for that version, so a write from another worker process (which
+    bumps the version in MongoDB) is seen on the next query. Bounded both by
+    number of users and by total matrix bytes; entries also expire after
+    `ttl_seconds` so idle users' matrices do not pin memory.
+    """
+
+    def __init__(self, max_users: int = EMBEDDING_CACHE_MAX_USERS, max_bytes: int = EMBEDDING_CACHE_MAX_BYTES,
+                 ttl_seconds: float = EMBEDDING_CACHE_TTL_SECONDS):
+        self.max_users = max_users
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()  # user_id -> (loaded_at, corpus_version, EmbeddingMatrix)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, user_id: str, corpus_version: int) -> Optional[EmbeddingMatrix]:
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and (time.monotonic() - entry[0] > self.ttl_seconds or entry[1] != corpus_version):
+                self._pop(user_id)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(user_id)
+            self.hits += 1
+            return entry[2]
+
+    def put(self, user_id: str, corpus_version: int, matrix: EmbeddingMatrix):
+        size = matrix.matrix.nbytes
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            self._pop(user_id)
+            self._entries[user_id] = (time.monotonic(), corpus_version, matrix)
+            self._bytes += size
+            self._evict()
+
+    def append(self, user_id: str, embeddings, ids, corpus_version: int):
+        """
+        Patches a cached matrix with newly inserted rows instead of dropping it.
+        `corpus_version` is the version the insert produced; the entry is only
+        patched if it was current just before, otherwise it is dropped.
+        """
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and entry[1] != corpus_version - 1:
+                self._pop(user_id)
+                entry = None
+        if entry is None:
+            return
+        extended = entry[2].extended(embeddings, ids)
+        extended.corpus_version = corpus_version
+        with self._lock:
+            if self._entries.get(user_id) is entry:
+                self._pop(user_id)
+                if extended.matrix.nbytes > self.max_bytes:
+                    return
+                self._entries[user_id] = (entry[0], corpus_version, extended)
+                self._bytes += extended.matrix.nbytes
+                self._evict()
+
+    def invalidate(self, user_id: str):
+        with self._lock:
+            self._pop(user_id)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "users": len(self._entries),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / total if total else 0.0,
+            }
+
+    def _pop(self, user_id: str):
+        entry = self._entries.pop(user_id, None)
+        if entry is not None:
+            self._bytes -= entry[2].matrix.nbytes
+
+    def _evict(self):
+        # Caller holds self._lock
+        while len(self._entries) > self.max_users or self._bytes > self.max_bytes:
+            oldest = next(iter(self._entries))
+            self._pop(oldest)
+            self.evictions += 1
+
+
+user_embedding_cache = UserEmbeddingCache()
@@ -1,24 +1,177 @@
-
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 import google.generativeai as genai
+from google.api_core import exceptions as google_exceptions
 from typing import List
-from utils.config import GEMINI_API_KEY
+from utils.text_embedding_cache import get_text_embedding_cache, text_key
+from utils import metrics
+from utils.config import (GEMINI_API_KEY, EMBEDDING_MODEL_NAME, EMBEDDING_BATCH_SIZE, EMBEDDING_MAX_WORKERS,
+                          EMBEDDING_MAX_RETRIES, EMBEDDING_BACKEND, EMBEDDING_LOCAL_MODEL_PATH,
+                          EMBEDDING_LOCAL_BATCH_SIZE, EMBEDDING_LOCAL_THREADS)
 
+# Errors worth retrying: rate limits, timeouts and server-side failures
+TRANSIENT_ERRORS = (
+    google_exceptions.ResourceExhausted,
+    google_exceptions.TooManyRequests,
+    google_exceptions.ServiceUnavailable,
+    google_exceptions.DeadlineExceeded,
+    google_exceptions.InternalServerError,
+    ConnectionError,
+    TimeoutError,
+)
 
-class EmbeddingGenerator:
-    def __init__(self, model_name: str = None):
-        self.embedding_model_name = "embedding-001"
-        print(f"Using Gemini API for embeddings: {self.embedding_model_name}")
+
+class EmbeddingError(Exception):
+    """Raised when one or more texts could not be embedded."""
+
+
+class GeminiEmbeddingBackend:
+    """Embeds batches with the Gemini embedding API.
+
+    Backends expose `model_name` (which keys the text embedding cache and
+    the ingestion manifest), `source` (the metrics label), default
+    `batch_size` and `max_workers`, and embed(batch) -> list of vectors.
+    """
+
+    source = "api"
+
+    def __init__(self, model_name: str = EMBEDDING_MODEL_NAME, batch_size: int = EMBEDDING_BATCH_SIZE,
+                 max_workers: int = EMBEDDING_MAX_WORKERS):
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.max_workers = max_workers
+        print(f"Using Gemini API for embeddings: {self.model_name}")
         genai.configure(api_key=GEMINI_API_KEY)
-        self.model = genai.GenerativeModel(self.embedding_model_name)
 
-    def generate_embeddings(self, texts: List[str]) -> List[List[float]]:
-        print(f"Generating embeddings for {len(texts)} chunks using Gemini API...")
-        embeddings = []
-        for text in texts:
+    def embed(self, batch: List[str]) -> List[List[float]]:
+        return genai.embed_content(model=f"models/{self.model_name}", content=batch)['embedding']
+
+
+# Loaded sentence-transformers models, shared by every embedder in the process
+_local_models = {}
+_local_models_lock = threading.Lock()
+
+
+class SentenceTransformerBackend:
+    """Embeds batches on the CPU with a sentence-transformers model loaded from a local path.
+
+    The model is loaded on first use and then shared by every backend for
+    the same path in this worker process. Batches run one at a time
+    (max_workers=1); each uses `threads` torch threads. Vectors are
+    L2-normalized. The model name is "local:<directory name>", so
+    switching backends re-embeds documents instead of mixing vector spaces.
+    """
+
+    source = "local"
+
+    def __init__(self, model_path: str = EMBEDDING_LOCAL_MODEL_PATH, batch_size: int = EMBEDDING_LOCAL_BATCH_SIZE,
+                 threads: int = EMBEDDING_LOCAL_THREADS):
+        self.model_path = os.path.abspath(model_path)
+        self.model_name = f"local:{os.path.basename(os.path.normpath(model_path))}"
+        self.batch_size = batch_size
+        self.max_workers = 1
+        self.threads = threads
+        print(f"Using local sentence-transformers model for embeddings: {self.model_path}")
+
+    @property
+    def model(self):
+        with _local_models_lock:
+            model = _local_models.get(self.model_path)
+            if model is None:
+                try:
+                    import torch
+                    from sentence_transformers import SentenceTransformer
+                except ImportError as e:
+                    raise EmbeddingError(
+                        "EMBEDDING_BACKEND=local needs the sentence-transformers and torch packages") from e
+                if not os.path.isdir(self.model_path):
+                    raise EmbeddingError(f"Local embedding model not found at {self.model_path}")
+                torch.set_num_threads(self.threads)
+                start = time.perf_counter()
+                model = _local_models[self.model_path] = SentenceTransformer(self.model_path, device="cpu")
+                print(f"Loaded {self.model_name} in {time.perf_counter() - start:.1f}s")
+            return model
+
+    def embed(self, batch: List[str]) -> List[List[float]]:
+        vectors = self.model.encode(batch, batch_size=self.batch_size, convert_to_numpy=True,
+                                    normalize_embeddings=True, show_progress_bar=False)
+        return vectors.tolist()
+
+
+def create_embedding_backend(backend: str = EMBEDDING_BACKEND, model_name: str = None):
+    if backend == "local":
+        return SentenceTransformerBackend(model_name or EMBEDDING_LOCAL_MODEL_PATH)
+    return GeminiEmbeddingBackend(model_name or EMBEDDING_MODEL_NAME)
+
+
+class EmbeddingGenerator:
+    """Embeds texts through a backend, with caching, de-duplication and batching in front of it.
+
+    `model_name` is the Gemini model name or, for the local backend, the
+    model path. Pass `backend` to use a specific backend instance.
+    """
+
+    def __init__(self, model_name: str = None, batch_size: int = None, max_workers: int = None,
+                 max_retries: int = EMBEDDING_MAX_RETRIES, cache=None, backend=None):
+        self.backend = backend or create_embedding_backend(model_name=model_name)
+        self.embedding_model_name = self.backend.model_name
+        self.cache = cache if cache is not None else get_text_embedding_cache()
+        self.batch_size = batch_size or self.backend.batch_size
+        self.max_workers = max_workers or self.backend.max_workers
+        self.max_retries = max_retries
+
+    def _embed_batch(self, batch: List[str]) -> List[List[float]]:
+        """Embeds one batch in a single request, retrying transient errors with exponential backoff."""
+        for attempt in range(self.max_retries + 1):
             try:
-                result = self.model.embed_content(content=text)
-                embeddings.append(result['embedding'])
+                return self.backend.embed(batch)
+            except TRANSIENT_ERRORS as e:
+                if attempt == self.max_retries:
+                    raise EmbeddingError(f"Embedding batch failed after {attempt + 1} attempts: {e}") from e
+                delay = min(2 ** attempt, 30) + random.uniform(0, 1)
+                metrics.embedding_retries.inc()
+                print(f"Transient embedding error ({e}); retrying in {delay:.1f}s")
+                time.sleep(delay)
+            except EmbeddingError:
+                raise
             except Exception as e:
-                print(f"Error generating embedding for text: {e}")
-                embeddings.append([0.0])
-        return embeddings
\ No newline at end of file
+                raise EmbeddingError(f"Embedding batch failed: {e}") from e
+
+    def generate_embeddings(self, texts: List[str]) -> List[List[float]]:
+        """
+        Embeds texts, serving repeats from the content-addressed cache and sending
+        the rest in batches of `batch_size`, up to `max_workers` batches concurrently.
+        Output order matches input order. Raises EmbeddingError instead of returning placeholders.
+        """
+        if not texts:
+            return []
+        with metrics.timed("embed"):
+            keys = [text_key(self.embedding_model_name, text) for text in texts]
+            cached = self.cache.get_many(list(set(keys)))
+            # Embed each distinct uncached text once
+            pending = {}
+            for key, text in zip(keys, texts):
+                if key not in cached and key not in pending:
+                    pending[key] = text
+            if pending:
+                fresh = self._embed_texts(list(pending.values()))
+                new_items = dict(zip(pending.keys(), fresh))
+                self.cache.put_many(new_items)
+                cached.update(new_items)
+        metrics.embedded_texts.inc(len(texts) - len(pending), source="cache")
+        metrics.embedded_texts.inc(len(pending), source=self.backend.source)
+        print(f"Embeddings for {len(texts)} chunks: {len(texts) - len(pending)} from cache, "
+              f"{len(pending)} from {self.embedding_model_name}")
+        return [cached[key] for key in keys]
+
+    def _embed_texts(self, texts: List[str]) -> List[List[float]]:
+        batches = [texts[i:i + self.batch_size] for i in range(0, len(texts), self.batch_size)]
+        metrics.embedding_requests.inc(len(batches))
+        if len(batches) == 1:
+            return self._embed_batch(batches[0])
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(batches))) as pool:
+            results = list(pool.map(self._embed_batch, batches))
+        return [embedding for batch in results for embedding in batch]
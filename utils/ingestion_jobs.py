@@ -0,0 +1,133 @@
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional
+from utils.config import INGEST_WORKERS, JOB_STORE_BACKEND
+from utils import metrics
+
+
+def _now():
+    return datetime.now(timezone.utc).isoformat()
+
+
+def _new_job(user_id: str, filenames: List[str]) -> Dict:
+    return {
+        "job_id": uuid.uuid4().hex,
+        "user_id": user_id,
+        "status": "queued",
+        "created_at": _now(),
+        "finished_at": None,
+        "error": None,
+        "files": {name: {"status": "queued", "chunks": 0, "error": None} for name in filenames},
+    }
+
+
+class InMemoryJobStore:
+    """Keeps jobs in a dict; suitable for a single worker process and for tests."""
+
+    def __init__(self):
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def create(self, user_id: str, filenames: List[str]) -> Dict:
+        job = _new_job(user_id, filenames)
+        with self._lock:
+            self._jobs[job["job_id"]] = job
+        return job
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            return {**job, "files": {k: dict(v) for k, v in job["files"].items()}}
+
+    def set_status(self, job_id: str, status: str, error: str = None):
+        with self._lock:
+            job = self._jobs[job_id]
+            job["status"] = status
+            job["error"] = error
+            if status in ("completed", "failed"):
+                job["finished_at"] = _now()
+
+    def update_file(self, job_id: str, filename: str, **fields):
+        with self._lock:
+            self._jobs[job_id]["files"].setdefault(filename, {"status": "queued", "chunks": 0, "error": None}).update(fields)
+
+
+class MongoJobStore:
+    """Keeps jobs in MongoDB so any gunicorn worker can report on them."""
+
+    def __init__(self, collection_name: str = "ingestion_jobs"):
+        from utils.config import mongo_db
+        self.collection = mongo_db[collection_name]
+
+    def create(self, user_id: str, filenames: List[str]) -> Dict:
+        job = _new_job(user_id, filenames)
+        # Filenames may contain '.', so per-file state is stored as a list
+        doc = {**job, "_id": job["job_id"], "files": [{"name": k, **v} for k, v in job["files"].items()]}
+        self.collection.insert_one(doc)
+        return job
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        doc = self.collection.find_one({"_id": job_id})
+        if doc is None:
+            return None
+        doc.pop("_id")
+        doc["files"] = {f.pop("name"): f for f in doc["files"]}
+        return doc
+
+    def set_status(self, job_id: str, status: str, error: str = None):
+        fields = {"status": status, "error": error}
+        if status in ("completed", "failed"):
+            fields["finished_at"] = _now()
+        self.collection.update_one({"_id": job_id}, {"$set": fields})
+
+    def update_file(self, job_id: str, filename: str, **fields):
+        result = self.collection.update_one(
+            {"_id": job_id, "files.name": filename},
+            {"$set": {f"files.$.{k}": v for k, v in fields.items()}},
+        )
+        if not result.matched_count:
+            entry = {"name": filename, "status": "queued", "chunks": 0, "error": None, **fields}
+            self.collection.update_one({"_id": job_id}, {"$push": {"files": entry}})
+
+
+class IngestionQueue:
+    """Runs indexing jobs on a bounded thread pool and records progress in a job store."""
+
+    def __init__(self, store, max_workers: int = INGEST_WORKERS):
+        self.store = store
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ingest")
+
+    def submit(self, index_fn: Callable, folder_path: str, user_id: str, filenames: List[str], **index_kwargs) -> str:
+        """
+        Enqueues index_fn(folder_path, user_id=..., progress=..., **index_kwargs) and returns the job id.
+        """
+        job = self.store.create(user_id, filenames)
+        self.executor.submit(self._run, job["job_id"], index_fn, folder_path, user_id, index_kwargs)
+        return job["job_id"]
+
+    def _run(self, job_id: str, index_fn: Callable, folder_path: str, user_id: str, index_kwargs: Dict = None):
+        self.store.set_status(job_id, "running")
+
+        def progress(filename, status, chunks=0, error=None):
+            self.store.update_file(job_id, filename, status=status, chunks=chunks, error=error)
+
+        with metrics.use_trace(metrics.Trace(f"ingest job {job_id}")) as trace:
+            try:
+                index_fn(folder_path, user_id=user_id, progress=progress, **(index_kwargs or {}))
+                self.store.set_status(job_id, "completed")
+                status = "completed"
+            except Exception as e:
+                print(f"Ingestion job {job_id} failed: {e}")
+                self.store.set_status(job_id, "failed", error=str(e))
+                status = "failed"
+            print(metrics.end_trace(trace, "ingest_job", status))
+
+
+def create_job_store(backend: str = JOB_STORE_BACKEND):
+    if backend == "mongo":
+        return MongoJobStore()
+    return InMemoryJobStore()
@@ -0,0 +1,95 @@
+import hashlib
+import os
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+from utils.config import mongo_db
+
+
+def file_sha256(file_path: str, block_size: int = 1 << 20) -> str:
+    """Returns the hex SHA-256 of a file, read in fixed-size blocks."""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class IngestionManifest:
+    """Tracks which version of each user's file is currently indexed.
+
+    One record per (user_id, doc_id) holding the content hash, the chunker
+    parameters and the embedding model used, so unchanged files can be
+    skipped on re-index. The same records (with chunk count, byte size and
+    indexed-at time) are the per-user document listing, so listing and
+    deleting documents never has to touch the chunk collection.
+    """
+
+    def __init__(self, collection_name: str = "ingestion_manifest"):
+        self.collection = mongo_db[collection_name]
+
+    def get(self, user_id: str, doc_id: str) -> Optional[Dict]:
+        return self.collection.find_one({"user_id": user_id, "doc_id": doc_id})
+
+    def record(self, user_id: str, doc_id: str, content_hash: str, text_length: int,
+               chunk_size: int, chunk_overlap: int, embedding_model: str, chunk_count: int,
+               size_bytes: int = None):
+        """
+        Upserts the manifest entry for a document after it has been indexed.
+        """
+        self.collection.update_one(
+            {"user_id": user_id, "doc_id": doc_id},
+            {"$set": {
+                "content_hash": content_hash,
+                "text_length": text_length,
+                "chunk_size": chunk_size,
+                "chunk_overlap": chunk_overlap,
+                "embedding_model": embedding_model,
+                "chunk_count": chunk_count,
+                "size_bytes": size_bytes,
+                "indexed_at": datetime.now(timezone.utc),
+            }},
+            upsert=True,
+        )
+
+    def list_documents(self, user_id: str) -> List[Dict]:
+        """The user's indexed documents, sorted by doc_id."""
+        projection = {"_id": 0, "doc_id": 1, "chunk_count": 1, "size_bytes": 1, "content_hash": 1, "indexed_at": 1}
+        docs = list(self.collection.find({"user_id": user_id}, projection))
+        return sorted(docs, key=lambda d: d["doc_id"])
+
+    def find_by_content(self, content_hash: str, embedding_model: str) -> List[Dict]:
+        """Entries (any user) whose indexed file had this content and embedding model."""
+        return list(self.collection.find({"content_hash": content_hash, "embedding_model": embedding_model}))
+
+    def ensure_indexes(self):
+        self.collection.create_index([("user_id", 1), ("doc_id", 1)])
+        self.collection.create_index([("content_hash", 1)])
+
+    def backfill(self, embeddings_collection, documents_dir: str = None) -> int:
+        """
+        Creates entries for documents indexed before the manifest existed,
+        grouping their chunks in `embeddings_collection`. The entries have
+        no content hash, so the next index run re-processes those files once.
+        Returns the number of entries created.
+        """
+        created = 0
+        pipeline = [{"$group": {"_id": {"user_id": "$user_id", "doc_id": "$doc_id"}, "chunk_count": {"$sum": 1}}}]
+        for row in embeddings_collection.aggregate(pipeline, allowDiskUse=True):
+            user_id, doc_id = row["_id"].get("user_id"), row["_id"].get("doc_id")
+            if user_id is None or doc_id is None:
+                continue
+            path = os.path.join(documents_dir, doc_id) if documents_dir else None
+            size_bytes = os.path.getsize(path) if path and os.path.isfile(path) else None
+            result = self.collection.update_one(
+                {"user_id": user_id, "doc_id": doc_id},
+                {"$setOnInsert": {"chunk_count": row["chunk_count"], "size_bytes": size_bytes}},
+                upsert=True,
+            )
+            created += result.upserted_id is not None
+        return created
+
+    def remove(self, user_id: str, doc_id: str = None):
+        query = {"user_id": user_id}
+        if doc_id:
+            query["doc_id"] = doc_id
+        self.collection.delete_many(query)
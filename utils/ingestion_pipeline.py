@@ -0,0 +1,104 @@
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Optional
+from utils.config import EXTRACT_WORKERS
+from utils.document_processor import DocumentProcessor
+from utils.text_chunker import TextChunker
+
+
+# chunk_params only distinguishes lengths below 5000 characters
+_PARAMS_LOOKAHEAD = 5000
+
+
+def chunk_params(doc_length: int):
+    """Returns the (chunk_size, chunk_overlap) used for a document of this length."""
+    if doc_length < 2000:
+        return 300, 50
+    elif doc_length < 5000:
+        return 500, 80
+    return 800, 120
+
+
+def extract_and_chunk(file_path: str) -> Optional[Dict]:
+    """
+    Extracts and chunks one file. Runs in an extraction worker process, so it
+    only touches CPU-bound parsing and returns plain picklable data.
+
+    Segments are streamed from the extractor into the chunker. Only the first
+    few thousand characters are held back, enough to pick the chunk
+    parameters (see chunk_params), so a long document is never materialized
+    as one string.
+
+    Extraction and chunking interleave, so the returned "timings" split the
+    elapsed time by timing each pull from the extractor. The caller records
+    them (see utils.metrics); metrics recorded in a worker process would be lost.
+    A read error partway through the file is raised, not returned as a
+    shorter result, so the file is never recorded in the manifest as indexed.
+    """
+    started = time.perf_counter()
+    extract_seconds = 0.0
+    segments = DocumentProcessor().iter_segments(file_path)
+    if segments is None:
+        return None
+
+    def pull():
+        nonlocal extract_seconds
+        while True:
+            t0 = time.perf_counter()
+            segment = next(segments, None)
+            extract_seconds += time.perf_counter() - t0
+            if segment is None:
+                return
+            yield segment
+
+    extracted = pull()
+    head, head_length = [], 0
+    for segment in extracted:
+        head.append(segment)
+        head_length += len(segment["text"])
+        if head_length >= _PARAMS_LOOKAHEAD:
+            break
+    text_length = head_length
+
+    def stream():
+        nonlocal text_length
+        yield from head
+        for segment in extracted:
+            text_length += len(segment["text"])
+            yield segment
+
+    chunk_size, chunk_overlap = chunk_params(head_length)
+    source = os.path.basename(file_path)
+    chunks = list(TextChunker(chunk_size, chunk_overlap).iter_chunks(stream(), source))
+    if not chunks:
+        print(f"No text could be extracted from {source}")
+        return None
+    return {
+        "text_length": text_length,
+        "chunk_size": chunk_size,
+        "chunk_overlap": chunk_overlap,
+        "chunks": chunks,
+        "timings": {"extract": extract_seconds, "chunk": time.perf_counter() - started - extract_seconds},
+    }
+
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def get_extraction_pool() -> Optional[ProcessPoolExecutor]:
+    """
+    Returns the process-wide extraction pool, or None when EXTRACT_WORKERS <= 1.
+    Uses the 'spawn' start method because the web process is multi-threaded.
+    """
+    global _pool
+    if EXTRACT_WORKERS <= 1:
+        return None
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=EXTRACT_WORKERS,
+                                        mp_context=multiprocessing.get_context("spawn"))
+        return _pool
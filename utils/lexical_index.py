@@ -0,0 +1,122 @@
+import math
+import re
+import threading
+from collections import Counter, OrderedDict
+from typing import Dict, List, Tuple
+import numpy as np
+from utils.config import mongo_db
+
+# Keeps identifiers like "AB-1234", "v2.5" or "part_no" together as one token
+_TOKEN = re.compile(r"[a-z0-9]+(?:[-_./][a-z0-9]+)*")
+
+
+def tokenize(text: str) -> List[str]:
+    return _TOKEN.findall(text.lower())
+
+
+def build_record(user_id: str, doc_id: str, chunk_texts: List[str], chunk_ids: List) -> Dict:
+    """
+    Builds the persisted inverted index for one document. Terms and postings
+    are parallel arrays (terms may contain '.', which Mongo keys cannot);
+    each posting list is flat [ordinal, tf, ordinal, tf, ...] where ordinal
+    indexes `chunk_ids`.
+    """
+    postings = {}
+    lengths = []
+    for ordinal, text in enumerate(chunk_texts):
+        counts = Counter(tokenize(text))
+        lengths.append(sum(counts.values()))
+        for term, tf in counts.items():
+            postings.setdefault(term, []).extend((ordinal, tf))
+    return {
+        "user_id": user_id,
+        "doc_id": doc_id,
+        "chunk_ids": list(chunk_ids),
+        "lengths": lengths,
+        "terms": list(postings.keys()),
+        "postings": list(postings.values()),
+    }
+
+
+class LexicalIndex:
+    """In-memory BM25 index merged from a user's per-document records."""
+
+    def __init__(self, records: List[Dict], k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.ids = []
+        lengths = []
+        rows, tfs = {}, {}
+        for record in records:
+            offset = len(self.ids)
+            self.ids.extend(record["chunk_ids"])
+            lengths.extend(record["lengths"])
+            for term, flat in zip(record["terms"], record["postings"]):
+                rows.setdefault(term, []).extend(o + offset for o in flat[0::2])
+                tfs.setdefault(term, []).extend(flat[1::2])
+        self.lengths = np.asarray(lengths, dtype=np.float32)
+        self.avg_length = float(self.lengths.mean()) if len(lengths) else 0.0
+        self.postings = {
+            term: (np.asarray(rows[term], dtype=np.int64), np.asarray(tfs[term], dtype=np.float32))
+            for term in rows
+        }
+
+    def __len__(self):
+        return len(self.ids)
+
+    def search(self, query: str, top_n: int) -> List[Tuple]:
+        """Returns up to `top_n` (chunk _id, BM25 score) pairs, best first."""
+        n = len(self.ids)
+        if not n:
+            return []
+        scores = np.zeros(n, dtype=np.float32)
+        for term in set(tokenize(query)):
+            posting = self.postings.get(term)
+            if posting is None:
+                continue
+            rows, tf = posting
+            idf = math.log(1 + (n - len(rows) + 0.5) / (len(rows) + 0.5))
+            norm = self.k1 * (1 - self.b + self.b * self.lengths[rows] / (self.avg_length or 1.0))
+            scores[rows] += idf * tf * (self.k1 + 1) / (tf + norm)
+        matched = np.flatnonzero(scores)
+        if matched.size > top_n:
+            matched = matched[np.argpartition(-scores[matched], top_n - 1)[:top_n]]
+        matched = matched[np.argsort(-scores[matched], kind="stable")]
+        return [(self.ids[i], float(scores[i])) for i in matched]
+
+
+class LexicalIndexStore:
+    """Persists per-document BM25 records in MongoDB next to the embeddings.
+
+    Merged per-user indexes are cached in process, keyed by the user's corpus
+    version so any write (from any worker) makes the cached copy stale.
+    """
+
+    def __init__(self, collection_name: str = "lexical_index", max_users: int = 64):
+        self.collection = mongo_db[collection_name]
+        self.max_users = max_users
+        self._cache = OrderedDict()  # user_id -> (corpus_version, LexicalIndex)
+        self._lock = threading.Lock()
+
+    def save(self, record: Dict):
+        self.collection.replace_one({"user_id": record["user_id"], "doc_id": record["doc_id"]}, record, upsert=True)
+
+    def delete(self, user_id: str, doc_id: str = None):
+        query = {"user_id": user_id}
+        if doc_id:
+            query["doc_id"] = doc_id
+        self.collection.delete_many(query)
+
+    def load(self, user_id: str, corpus_version: int) -> LexicalIndex:
+        with self._lock:
+            cached = self._cache.get(user_id)
+            if cached and cached[0] == corpus_version:
+                self._cache.move_to_end(user_id)
+                return cached[1]
+        index = LexicalIndex(list(self.collection.find({"user_id": user_id}, {"_id": 0})))
+        with self._lock:
+            self._cache[user_id] = (corpus_version, index)
+            self._cache.move_to_end(user_id)
+            while len(self._cache) > self.max_users:
+                self._cache.popitem(last=False)
+        return index
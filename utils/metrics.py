@@ -0,0 +1,204 @@
+import bisect
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Optional, Sequence
+
+# Upper bounds in seconds; covers sub-millisecond scoring up to minute-long ingestion
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _label_str(labelnames: Sequence[str], key: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{value}"' for name, value in zip(labelnames, key)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    """Monotonic counter.
+
+    If `trace_name` is set, increments are also added to the active Trace,
+    under `trace_name` suffixed with the label values (e.g. "tokens_output").
+    """
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = (), trace_name: str = None):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self.trace_name = trace_name
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+        if self.trace_name:
+            trace = _current_trace.get()
+            if trace is not None:
+                trace.add_count("_".join((self.trace_name,) + key), amount)
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_label_str(self.labelnames, key)} {value}")
+        return "\n".join(lines)
+
+
+class Histogram:
+    """Cumulative-bucket latency histogram in the Prometheus text format."""
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = (), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._counts = {}  # label key -> per-bucket counts, last slot is +Inf
+        self._sums = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        slot = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts = self._counts.get(key)
+            if counts is None:
+                counts = self._counts[key] = [0] * (len(self.buckets) + 1)
+                self._sums[key] = 0.0
+            counts[slot] += 1
+            self._sums[key] += value
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key in sorted(self._counts):
+                cumulative = 0
+                for bound, count in zip(self.buckets + (float("inf"),), self._counts[key]):
+                    cumulative += count
+                    le = "+Inf" if bound == float("inf") else repr(bound)
+                    bucket_labels = _label_str(self.labelnames, key, 'le="%s"' % le)
+                    lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+                labels = _label_str(self.labelnames, key)
+                lines.append(f"{self.name}_sum{labels} {self._sums[key]}")
+                lines.append(f"{self.name}_count{labels} {cumulative}")
+        return "\n".join(lines)
+
+
+class MetricsRegistry:
+    """Process-local metrics. Under gunicorn each worker keeps (and serves) its own."""
+
+    def __init__(self):
+        self._metrics = []
+
+    def counter(self, name: str, help_text: str, labelnames: Sequence[str] = (), trace_name: str = None) -> Counter:
+        metric = Counter(name, help_text, labelnames, trace_name)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, help_text: str, labelnames: Sequence[str] = (), buckets=DEFAULT_BUCKETS) -> Histogram:
+        metric = Histogram(name, help_text, labelnames, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        return "\n".join(metric.render() for metric in self._metrics) + "\n"
+
+
+registry = MetricsRegistry()
+
+stage_seconds = registry.histogram(
+    "rag_stage_seconds", "Time spent in each pipeline stage.", ("stage",))
+request_seconds = registry.histogram(
+    "rag_request_seconds", "End-to-end latency of HTTP requests and ingestion jobs.", ("endpoint", "status"))
+chunks_indexed = registry.counter(
+    "rag_chunks_indexed_total", "Chunks embedded and stored.", trace_name="chunks_indexed")
+chunks_retrieved = registry.counter(
+    "rag_chunks_retrieved_total", "Context chunks selected for answers.", trace_name="chunks")
+embedding_requests = registry.counter(
+    "rag_embedding_requests_total", "Embedding API batch requests (excluding retries).", trace_name="embed_calls")
+embedding_retries = registry.counter(
+    "rag_embedding_retries_total", "Embedding API requests retried after a transient error.")
+embedded_texts = registry.counter(
+    "rag_embedded_texts_total", "Texts embedded, by where the vector came from.", ("source",))
+llm_tokens = registry.counter(
+    "rag_llm_tokens_total", "Gemini tokens reported in response usage metadata.", ("kind",), trace_name="tokens")
+
+
+class Trace:
+    """Stage durations and counts for one request or job, reported as a single timing line."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.started = time.perf_counter()
+        self.stages: Dict[str, float] = {}
+        self.counts: Dict[str, float] = {}
+        # Concurrent query stages (utils.query_pipeline) report from pool threads
+        self._lock = threading.Lock()
+
+    def add_stage(self, stage: str, seconds: float):
+        with self._lock:
+            self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+    def add_count(self, name: str, amount: float):
+        with self._lock:
+            self.counts[name] = self.counts.get(name, 0) + amount
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+    def summary(self, status=None) -> str:
+        parts = [self.name]
+        if status is not None:
+            parts.append(str(status))
+        parts.append(f"total={self.elapsed() * 1000:.1f}ms")
+        parts.extend(f"{stage}={seconds * 1000:.1f}ms" for stage, seconds in self.stages.items())
+        parts.extend(f"{name}={amount:g}" for name, amount in self.counts.items())
+        return " ".join(parts)
+
+
+_current_trace: contextvars.ContextVar = contextvars.ContextVar("rag_trace", default=None)
+
+
+def start_trace(name: str) -> Trace:
+    """Starts a trace and makes it the active one for the current thread/context."""
+    trace = Trace(name)
+    _current_trace.set(trace)
+    return trace
+
+
+@contextmanager
+def use_trace(trace: Optional[Trace]):
+    """Makes `trace` active inside the block, e.g. while a streamed response is generated."""
+    token = _current_trace.set(trace)
+    try:
+        yield trace
+    finally:
+        _current_trace.reset(token)
+
+
+def end_trace(trace: Trace, endpoint: str, status="") -> str:
+    """Records the request latency and returns the trace's timing line."""
+    request_seconds.observe(trace.elapsed(), endpoint=endpoint, status=status)
+    if _current_trace.get() is trace:
+        _current_trace.set(None)
+    return trace.summary(status)
+
+
+def record_stage(stage: str, seconds: float):
+    stage_seconds.observe(seconds, stage=stage)
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.add_stage(stage, seconds)
+
+
+@contextmanager
+def timed(stage: str):
+    """Times the block as one observation of `stage`."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(stage, time.perf_counter() - start)
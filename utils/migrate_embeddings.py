@@ -0,0 +1,14 @@
+"""Converts stored embeddings to another storage format.
+
+Usage: python -m utils.migrate_embeddings [list|float32|int8]
+Defaults to EMBEDDING_STORAGE_FORMAT from utils/config.py.
+"""
+import sys
+from utils.mongo_embedding_store import MongoEmbeddingStore
+
+
+if __name__ == "__main__":
+    target = sys.argv[1] if len(sys.argv) > 1 else None
+    store = MongoEmbeddingStore()
+    converted = store.migrate_storage_format(target)
+    print(f"Converted {converted} embedding(s) to {target or store.storage_format}")
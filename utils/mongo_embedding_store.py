@@ -1,22 +1,50 @@
-from utils.config import mongo_db
+from utils.config import mongo_db, ANN_MIN_CHUNKS, ANN_NPROBE, EMBEDDING_STORAGE_FORMAT
+from utils.ann_index import IVFIndex, AnnIndexStore
+from utils.lexical_index import LexicalIndex, LexicalIndexStore, build_record
+from utils.embedding_cache import user_embedding_cache
+from utils.retrieval import EmbeddingMatrix
+from utils.vector_codec import decode_embedding, encode_embedding, FORMATS
+from pymongo import ReturnDocument, UpdateOne
 from typing import List, Dict, Any
 
 class MongoEmbeddingStore:
     """Stores chunk embeddings and metadata in MongoDB."""
 
-    def __init__(self, collection_name: str = "embeddings"):
+    def __init__(self, collection_name: str = "embeddings", cache=user_embedding_cache,
+                 storage_format: str = EMBEDDING_STORAGE_FORMAT):
+        if storage_format not in FORMATS:
+            raise ValueError(f"storage_format must be one of {FORMATS}")
         self.collection = mongo_db[collection_name]
+        self.storage_format = storage_format
+        self.cache = cache
+        self.ann_store = AnnIndexStore()
+        self.lexical_store = LexicalIndexStore()
+        self.corpus_versions = mongo_db["corpus_versions"]
+
+    def get_corpus_version(self, user_id: str) -> int:
+        """Counter bumped on every change to the user's chunks; keys the answer cache."""
+        doc = self.corpus_versions.find_one({"_id": user_id})
+        return doc["version"] if doc else 0
+
+    def _bump_corpus_version(self, user_id: str) -> int:
+        doc = self.corpus_versions.find_one_and_update({"_id": user_id}, {"$inc": {"version": 1}},
+                                                       upsert=True, return_document=ReturnDocument.AFTER)
+        return doc["version"]
 
     def delete_document_embeddings(self, user_id: str, doc_id: str):
         """
         Delete all embeddings for a specific document and user.
         """
         self.collection.delete_many({"user_id": user_id, "doc_id": doc_id})
+        self.lexical_store.delete(user_id, doc_id)
+        self._bump_corpus_version(user_id)
+        self.cache.invalidate(user_id)
 
     def add_chunk_embeddings(self, user_id: str, doc_id: str, chunks: List[Dict], embeddings: List[List[float]]):
         """
         Stores each chunk's embedding and metadata in MongoDB.
-        Each document contains: user_id, doc_id, chunk_id, chunk_text, embedding, metadata.
+        Each document contains: user_id, doc_id, chunk_id, chunk_text, embedding, metadata,
+        with the embedding encoded per `storage_format`.
         """
         docs = []
         for chunk, embedding in zip(chunks, embeddings):
@@ -25,12 +53,43 @@ class MongoEmbeddingStore:
                 "doc_id": doc_id,
                 "chunk_id": chunk["id"],
                 "chunk_text": chunk["text"],
-                "embedding": embedding,
-                "metadata": chunk.get("metadata", {})
+                "metadata": chunk.get("metadata", {}),
+                **encode_embedding(embedding, self.storage_format),
             }
             docs.append(doc)
-        if docs:
-            self.collection.insert_many(docs)
+        self._insert_chunks(user_id, doc_id, docs, list(embeddings[:len(docs)]))
+
+    def copy_document_embeddings(self, src_user_id: str, src_doc_id: str, user_id: str, doc_id: str) -> int:
+        """
+        Stores the chunks of an already indexed document with identical content
+        as user_id/doc_id, reusing their text and embeddings instead of
+        extracting and embedding again. Returns the number of chunks copied.
+        """
+        def ordinal(doc):
+            position = (doc.get("chunk_id") or "").rpartition("_chunk_")[2]
+            return int(position) if position.isdigit() else 0
+
+        # Chunk order matters to the context packer's adjacent-chunk merging
+        source = sorted(self.collection.find({"user_id": src_user_id, "doc_id": src_doc_id}), key=ordinal)
+        docs = []
+        for doc in source:
+            doc.pop("_id")
+            chunk_id = doc.get("chunk_id") or ""
+            if chunk_id.startswith(f"{src_doc_id}_chunk_"):
+                chunk_id = doc_id + chunk_id[len(src_doc_id):]
+            docs.append({**doc, "user_id": user_id, "doc_id": doc_id, "chunk_id": chunk_id,
+                         "metadata": {**doc.get("metadata", {}), "source": doc_id}})
+        self._insert_chunks(user_id, doc_id, docs, [decode_embedding(d) for d in docs])
+        return len(docs)
+
+    def _insert_chunks(self, user_id: str, doc_id: str, docs: List[Dict], embeddings: List):
+        if not docs:
+            return
+        result = self.collection.insert_many(docs)
+        self.lexical_store.save(build_record(user_id, doc_id, [d["chunk_text"] for d in docs], result.inserted_ids))
+        corpus_version = self._bump_corpus_version(user_id)
+        # New rows are bucketed with the user's existing ANN centroids
+        self.cache.append(user_id, embeddings, list(result.inserted_ids), corpus_version)
 
     def get_user_embeddings(self, user_id: str, doc_id: str = None):
         query = {"user_id": user_id}
@@ -38,5 +97,91 @@ class MongoEmbeddingStore:
             query["doc_id"] = doc_id
         return list(self.collection.find(query))
 
+    def ensure_indexes(self):
+        """Creates the compound index every per-user and per-document query relies on."""
+        self.collection.create_index([("user_id", 1), ("doc_id", 1), ("chunk_id", 1)])
+        self.lexical_store.collection.create_index([("user_id", 1), ("doc_id", 1)])
+
+    def get_user_vectors(self, user_id: str) -> List[Dict]:
+        """Vectors-only projection for scoring: _id plus the encoded embedding fields."""
+        return list(self.collection.find(
+            {"user_id": user_id},
+            {"_id": 1, "embedding": 1, "embedding_format": 1, "embedding_scale": 1},
+        ))
+
+    def get_user_matrix(self, user_id: str, corpus_version: int = None) -> EmbeddingMatrix:
+        """
+        Returns the user's embeddings as a normalized matrix whose ids are chunk _ids.
+        Served from the in-process cache only if it was loaded at the current
+        corpus version, so writes from other workers are seen immediately.
+        Pass `corpus_version` if the caller has already fetched it.
+        """
+        if corpus_version is None:
+            corpus_version = self.get_corpus_version(user_id)
+        matrix = self.cache.get(user_id, corpus_version)
+        if matrix is None:
+            # The version is read before the vectors, so a concurrent write can
+            # only make the matrix newer than its tag (a harmless reload), never older
+            matrix = EmbeddingMatrix.from_chunks(self.get_user_vectors(user_id))
+            matrix.corpus_version = corpus_version
+            self._attach_ann(user_id, matrix)
+            self.cache.put(user_id, corpus_version, matrix)
+        return matrix
+
+    def _attach_ann(self, user_id: str, matrix: EmbeddingMatrix):
+        """Loads (or trains and persists) the user's IVF index for large corpora."""
+        if len(matrix) < ANN_MIN_CHUNKS:
+            return
+        ann = self.ann_store.load(user_id)
+        if ann is None or ann.is_stale(len(matrix), matrix.matrix.shape[1]):
+            ann = IVFIndex.train(matrix.matrix)
+            self.ann_store.save(user_id, ann)
+        matrix.attach_ann(ann, ANN_NPROBE)
+
+    def get_lexical_index(self, user_id: str) -> LexicalIndex:
+        """The user's BM25 index, rebuilt from Mongo only when the corpus version changed."""
+        return self.lexical_store.load(user_id, self.get_corpus_version(user_id))
+
+    def get_chunks_by_ids(self, ids: List) -> List[Dict]:
+        """
+        Second retrieval phase: fetches text and metadata for the selected chunk
+        _ids in one batched query, returned in the order of `ids`.
+        """
+        projection = {"doc_id": 1, "chunk_id": 1, "chunk_text": 1, "metadata": 1}
+        by_id = {doc["_id"]: doc for doc in self.collection.find({"_id": {"$in": list(ids)}}, projection)}
+        return [by_id[i] for i in ids if i in by_id]
+
     def clear_user_embeddings(self, user_id: str):
         self.collection.delete_many({"user_id": user_id})
+        self.lexical_store.delete(user_id)
+        self._bump_corpus_version(user_id)
+        self.ann_store.delete(user_id)
+        self.cache.invalidate(user_id)
+
+    def migrate_storage_format(self, target_format: str = None, batch_size: int = 500) -> int:
+        """
+        Re-encodes stored embeddings that are not yet in `target_format`
+        (default: this store's format). Safe to re-run; returns the count converted.
+        """
+        target_format = target_format or self.storage_format
+        query = {"embedding_format": {"$ne": target_format}}
+        if target_format == "list":
+            query = {"embedding_format": {"$exists": True, "$ne": "list"}}
+        converted = 0
+        ops = []
+        users = set()
+        for doc in self.collection.find(query, {"embedding": 1, "embedding_format": 1, "embedding_scale": 1, "user_id": 1}):
+            fields = encode_embedding(decode_embedding(doc), target_format)
+            update = {"$set": fields}
+            if target_format != "int8":
+                update["$unset"] = {"embedding_scale": ""}
+            ops.append(UpdateOne({"_id": doc["_id"]}, update))
+            users.add(doc.get("user_id"))
+            if len(ops) >= batch_size:
+                converted += self.collection.bulk_write(ops, ordered=False).modified_count
+                ops = []
+        if ops:
+            converted += self.collection.bulk_write(ops, ordered=False).modified_count
+        for user_id in users:
+            self.cache.invalidate(user_id)
+        return converted
@@ -0,0 +1,76 @@
+import contextvars
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeout
+from typing import Callable, List, Optional
+from utils.config import QUERY_WORKERS
+
+
+class QueryTimeout(TimeoutError):
+    """A query stage did not finish within its timeout."""
+
+
+class QueryCancelled(Exception):
+    """The query was cancelled, e.g. because the client disconnected."""
+
+
+_pool: Optional[ThreadPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def get_query_pool() -> ThreadPoolExecutor:
+    """Returns the process-wide pool that runs query-time I/O stages."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(max_workers=QUERY_WORKERS, thread_name_prefix="query")
+        return _pool
+
+
+class QueryPipeline:
+    """Runs one query's independent I/O stages concurrently on the query pool.
+
+    Stages are submitted up front and awaited in the order they are needed,
+    each with its own timeout. Stages run in a copy of the caller's context,
+    so the request's metrics trace still sees them. cancel() (or setting
+    `cancel_event` from another thread) abandons the query: waiting stops
+    and stages that have not started yet are dropped. Stages already running
+    finish in the background, since threads cannot be interrupted.
+    """
+
+    def __init__(self, cancel_event: threading.Event = None, pool: ThreadPoolExecutor = None,
+                 poll_interval: float = 0.05):
+        self.cancel_event = cancel_event or threading.Event()
+        self.pool = pool or get_query_pool()
+        self.poll_interval = poll_interval
+        self._futures: List[Future] = []
+
+    def submit(self, fn: Callable, *args) -> Future:
+        future = self.pool.submit(contextvars.copy_context().run, fn, *args)
+        self._futures.append(future)
+        return future
+
+    def result(self, future: Future, stage: str, timeout: float):
+        """Waits for a stage's result, raising QueryTimeout or QueryCancelled instead of blocking on."""
+        deadline = time.monotonic() + timeout
+        while True:
+            if self.cancel_event.is_set():
+                self.cancel()
+                raise QueryCancelled(f"Query cancelled while waiting for {stage}")
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                self.cancel()
+                raise QueryTimeout(f"Timed out after {timeout:g}s waiting for {stage}")
+            try:
+                return future.result(timeout=min(remaining, self.poll_interval))
+            except FutureTimeout:
+                continue
+
+    @property
+    def cancelled(self) -> bool:
+        return self.cancel_event.is_set()
+
+    def cancel(self):
+        self.cancel_event.set()
+        for future in self._futures:
+            future.cancel()
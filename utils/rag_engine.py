@@ -1,28 +1,38 @@
 import google.generativeai as genai
-from typing import List, Dict
+from typing import List, Dict, Iterator
+from utils import metrics
+from utils.context_packer import ContextPacker, truncate_to_tokens
+from utils.config import QUERY_GENERATE_TIMEOUT, CHAT_SUMMARY_TOKEN_BUDGET
 
 class RAGEngine:
     """Retrieval-Augmented Generation engine using Gemini."""
 
-    def __init__(self, api_key: str, model_name: str):
+    NO_CONTEXT_ANSWER = "Sorry, I couldn't find any relevant information in the provided documents to answer your question."
+
+    def __init__(self, api_key: str, model_name: str, packer: ContextPacker = None,
+                 timeout: float = QUERY_GENERATE_TIMEOUT):
         genai.configure(api_key=api_key)
         self.model = genai.GenerativeModel(model_name)
+        self.packer = packer or ContextPacker()
+        self.timeout = timeout
         print(f"RAG Engine initialized with Gemini model: {model_name}")
 
-    def generate_response(self, query: str, context_chunks: List[Dict], chat_history=None) -> str:
-        """Generates a response from Gemini based on the query, context, and chat history."""
-        if not context_chunks:
-            return "Sorry, I couldn't find any relevant information in the provided documents to answer your question."
-
-        context = "\n\n---\n\n".join([chunk['text'] for chunk in context_chunks])
+    def build_prompt(self, query: str, context_chunks: List[Dict], chat_history=None) -> str:
+        """
+        Builds the Gemini prompt from the query, context, and chat history.
+        Context and history are packed into their token budgets (see ContextPacker).
+        """
+        context = "\n\n---\n\n".join(self.packer.pack_context(context_chunks))
 
         # Format chat history if present
         history_str = ""
         if chat_history:
-            for turn in chat_history[-10:]:
+            for turn in self.packer.pack_history(chat_history, query):
                 role = turn.get('role', 'user')
                 content = turn.get('content', '')
-                if role == 'user':
+                if role == 'summary':
+                    history_str += f"Summary of earlier conversation: {content}\n"
+                elif role == 'user':
                     history_str += f"User: {content}\n"
                 elif role == 'assistant':
                     history_str += f"Assistant: {content}\n"
@@ -43,9 +53,71 @@ class RAGEngine:
 
         ANSWER:
         """
+        return prompt
+
+    def generate_response(self, query: str, context_chunks: List[Dict], chat_history=None) -> str:
+        """Generates a response from Gemini based on the query, context, and chat history."""
+        if not context_chunks:
+            return self.NO_CONTEXT_ANSWER
 
+        with metrics.timed("prompt"):
+            prompt = self.build_prompt(query, context_chunks, chat_history)
         try:
-            response = self.model.generate_content(prompt)
+            with metrics.timed("generate"):
+                response = self.model.generate_content(prompt, request_options={"timeout": self.timeout})
+            self._count_tokens(response)
             return response.text
         except Exception as e:
-            return f"An error occurred while generating the response: {e}"
\ No newline at end of file
+            return f"An error occurred while generating the response: {e}"
+
+    def generate_response_stream(self, query: str, context_chunks: List[Dict], chat_history=None) -> Iterator[str]:
+        """
+        Like generate_response, but yields text pieces as Gemini produces them.
+        A generation error is raised after any pieces already yielded, so the
+        caller can tell a partial answer from a complete one.
+        """
+        if not context_chunks:
+            yield self.NO_CONTEXT_ANSWER
+            return
+
+        with metrics.timed("prompt"):
+            prompt = self.build_prompt(query, context_chunks, chat_history)
+        # Includes time the consumer spends between pieces (e.g. sending them)
+        with metrics.timed("generate"):
+            part = None
+            for part in self.model.generate_content(prompt, stream=True, request_options={"timeout": self.timeout}):
+                if part.text:
+                    yield part.text
+        # The last streamed part carries the usage totals
+        self._count_tokens(part)
+
+    def summarize_history(self, summary: str, turns: List[Dict],
+                          max_tokens: int = CHAT_SUMMARY_TOKEN_BUDGET) -> str:
+        """Folds chat turns into the running conversation summary (see utils.chat_history)."""
+        transcript = "\n".join(f"{t.get('role', 'user').capitalize()}: {t.get('content', '')}" for t in turns)
+        prompt = f"""
+        Update the running summary of a conversation between a user and an assistant
+        answering questions about the user's documents. Keep the facts, names, numbers and
+        open questions a follow-up question might refer to. Reply with the summary only,
+        in at most {max_tokens * 3 // 4} words.
+
+        CURRENT SUMMARY:
+        {summary or "(none)"}
+
+        NEW TURNS:
+        {transcript}
+
+        UPDATED SUMMARY:
+        """
+        with metrics.timed("summarize"):
+            response = self.model.generate_content(prompt, request_options={"timeout": self.timeout})
+        self._count_tokens(response)
+        return truncate_to_tokens(response.text.strip(), max_tokens)
+
+    @staticmethod
+    def _count_tokens(response):
+        usage = getattr(response, "usage_metadata", None)
+        if usage is None:
+            return
+        metrics.llm_tokens.inc(getattr(usage, "prompt_token_count", 0) or 0, kind="prompt")
+        metrics.llm_tokens.inc(getattr(usage, "candidates_token_count", 0) or 0, kind="output")
@@ -0,0 +1,196 @@
+import numpy as np
+from typing import List, Dict, Sequence
+from utils.vector_codec import decode_embedding
+from utils import metrics
+
+
+def normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    """L2-normalizes each row in place; zero rows are left as zeros."""
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    matrix /= norms
+    return matrix
+
+
+def to_unit_vector(vector: Sequence[float]) -> np.ndarray:
+    vec = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(vec)
+    return vec / norm if norm else vec
+
+
+class EmbeddingMatrix:
+    """A user's chunk embeddings held as one normalized float32 matrix.
+
+    Row i corresponds to ``ids[i]``. Vectors whose length differs from the
+    majority dimension (e.g. failed embeddings) become zero rows, which score
+    0.0 exactly like the old pure-Python cosine did for zero vectors.
+    """
+
+    def __init__(self, embeddings: List[Sequence[float]], ids: List = None, dim: int = None):
+        self.ids = list(ids) if ids is not None else list(range(len(embeddings)))
+        if dim is None:
+            dims = [len(e) for e in embeddings]
+            dim = max(set(dims), key=dims.count) if dims else 0
+        self.matrix = np.zeros((len(embeddings), dim), dtype=np.float32)
+        for i, emb in enumerate(embeddings):
+            if len(emb) == dim:
+                self.matrix[i] = emb
+        normalize_rows(self.matrix)
+        # Optional IVF index (utils.ann_index) used to pre-filter candidates
+        self.ann = None
+        self.nprobe = None
+        # Corpus version the rows were loaded at (set by MongoEmbeddingStore)
+        self.corpus_version = None
+
+    @classmethod
+    def from_chunks(cls, chunks: List[Dict]) -> "EmbeddingMatrix":
+        return cls([decode_embedding(c) for c in chunks], [c.get("_id") for c in chunks])
+
+    def __len__(self):
+        return self.matrix.shape[0]
+
+    def attach_ann(self, ann, nprobe: int):
+        ann.attach(self.matrix)
+        self.ann = ann
+        self.nprobe = nprobe
+
+    def extended(self, embeddings: List[Sequence[float]], ids: List) -> "EmbeddingMatrix":
+        """Returns a new matrix with rows appended; the ANN index, if any, is carried over."""
+        if not len(self):
+            return EmbeddingMatrix(embeddings, ids)
+        added = EmbeddingMatrix(embeddings, ids, dim=self.matrix.shape[1])
+        combined = EmbeddingMatrix([], dim=self.matrix.shape[1])
+        combined.ids = self.ids + added.ids
+        combined.matrix = np.vstack([self.matrix, added.matrix])
+        if self.ann is not None:
+            combined.ann = self.ann.extend(added.matrix)
+            combined.nprobe = self.nprobe
+        return combined
+
+    def scores(self, query_embedding: Sequence[float]) -> np.ndarray:
+        """Cosine similarity of the query against every row."""
+        query = to_unit_vector(query_embedding)
+        if query.shape[0] != self.matrix.shape[1]:
+            return np.zeros(len(self), dtype=np.float32)
+        return self.matrix @ query
+
+    def row_of(self, chunk_id):
+        """Row index of a chunk _id, or None if it is not in this matrix."""
+        if not hasattr(self, "_row_of"):
+            self._row_of = {cid: i for i, cid in enumerate(self.ids)}
+        return self._row_of.get(chunk_id)
+
+    def _dense_candidates(self, query: np.ndarray, top_k: int):
+        """Rows to consider and their dense relevance (ANN-probed when an index is attached)."""
+        if self.ann is not None and query.shape[0] == self.ann.dim:
+            candidates = self.ann.search(query, self.nprobe)
+            if candidates.size >= top_k:
+                relevance = np.zeros(len(self), dtype=np.float32)
+                relevance[candidates] = self.matrix[candidates] @ query
+                return candidates, relevance
+        if query.shape[0] != self.matrix.shape[1]:
+            return np.arange(len(self)), np.zeros(len(self), dtype=np.float32)
+        return np.arange(len(self)), self.matrix @ query
+
+    def mmr(self, query_embedding: Sequence[float], lambda_param: float = 0.7, top_k: int = 10,
+            lexical_ids: List = None, fusion_candidates: int = 100, rrf_k: int = 60) -> List[int]:
+        """Maximal Marginal Relevance selection; returns row indices in pick order.
+
+        With an ANN index attached, only rows in the probed buckets are scored;
+        if that yields fewer than `top_k` candidates the exact scan is used.
+        If `lexical_ids` (chunk _ids ranked by BM25) is given, the top
+        `fusion_candidates` dense rows and the lexical hits are fused with
+        reciprocal rank fusion, and MMR runs over the fused set using the
+        max-normalized fused score as relevance.
+        """
+        with metrics.timed("score"):
+            query = to_unit_vector(query_embedding)
+            candidates, relevance = self._dense_candidates(query, top_k)
+            candidates, relevance = self._fuse(candidates, relevance, lexical_ids, fusion_candidates, rrf_k)
+        with metrics.timed("mmr"):
+            return self._mmr_rows(candidates, relevance, lambda_param, top_k, bool(lexical_ids))
+
+    def mmr_batch(self, query_embeddings: List[Sequence[float]], lambda_param: float = 0.7, top_k: int = 10,
+                  lexical_ids: List[List] = None, fusion_candidates: int = 100, rrf_k: int = 60) -> List[List[int]]:
+        """
+        mmr() for many queries at once. Without an ANN index, every query is
+        scored against the matrix with a single matrix-matrix product.
+        `lexical_ids`, if given, holds one BM25 ranking per query.
+        """
+        lexical_ids = lexical_ids or [None] * len(query_embeddings)
+        with metrics.timed("score"):
+            queries = [to_unit_vector(q) for q in query_embeddings]
+            dim = self.matrix.shape[1]
+            if self.ann is None and queries and all(q.shape[0] == dim for q in queries):
+                all_rows = np.arange(len(self))
+                dense = [(all_rows, relevance) for relevance in np.stack(queries) @ self.matrix.T]
+            else:
+                dense = [self._dense_candidates(query, top_k) for query in queries]
+            fused = [self._fuse(candidates, relevance, lexical, fusion_candidates, rrf_k)
+                     for (candidates, relevance), lexical in zip(dense, lexical_ids)]
+        with metrics.timed("mmr"):
+            return [self._mmr_rows(candidates, relevance, lambda_param, top_k, bool(lexical))
+                    for (candidates, relevance), lexical in zip(fused, lexical_ids)]
+
+    def _fuse(self, candidates: np.ndarray, relevance: np.ndarray, lexical_ids: List,
+              fusion_candidates: int, rrf_k: int):
+        """Candidates and relevance after fusing in the lexical ranking; unchanged without one."""
+        if not lexical_ids:
+            return candidates, relevance
+        lexical_rows = [r for r in (self.row_of(cid) for cid in lexical_ids) if r is not None]
+        n_dense = min(fusion_candidates, candidates.size)
+        dense_top = candidates[np.argpartition(-relevance[candidates], n_dense - 1)[:n_dense]]
+        dense_top = dense_top[np.argsort(-relevance[dense_top], kind="stable")]
+        fused = reciprocal_rank_fusion([dense_top.tolist(), lexical_rows], rrf_k)
+        fused = fused[:fusion_candidates]
+        candidates = np.asarray([row for row, _ in fused], dtype=np.int64)
+        top_score = fused[0][1]
+        relevance = np.zeros(len(self), dtype=np.float32)
+        relevance[candidates] = [score / top_score for _, score in fused]
+        return candidates, relevance
+
+    def _mmr_rows(self, candidates: np.ndarray, relevance: np.ndarray, lambda_param: float, top_k: int,
+                  fused: bool) -> List[int]:
+        if fused or candidates.size < len(self):
+            return mmr_select(self.matrix, relevance, lambda_param, top_k, candidates=candidates)
+        return mmr_select(self.matrix, relevance, lambda_param, top_k)
+
+
+def reciprocal_rank_fusion(rankings: List[List], k: int = 60) -> List[tuple]:
+    """Fuses ranked lists: score(item) = sum over lists of 1 / (k + rank). Best first."""
+    scores = {}
+    for ranking in rankings:
+        for rank, item in enumerate(ranking, start=1):
+            scores[item] = scores.get(item, 0.0) + 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda kv: kv[1], reverse=True)
+
+
+def mmr_select(matrix: np.ndarray, relevance: np.ndarray, lambda_param: float = 0.7, top_k: int = 10,
+               candidates: np.ndarray = None) -> List[int]:
+    """
+    Greedy MMR over normalized rows of `matrix`.
+    Keeps a running max-similarity-to-selected vector so each step costs one
+    matrix-vector product instead of re-scoring every selected chunk.
+    If `candidates` is given, only those row indices are considered.
+    """
+    if candidates is None:
+        candidates = np.arange(matrix.shape[0])
+    candidates = np.asarray(candidates, dtype=np.int64)
+    if candidates.size == 0:
+        return []
+    sub = matrix[candidates]
+    rel = relevance[candidates].astype(np.float32)
+    max_sim = np.full(candidates.size, -np.inf, dtype=np.float32)
+    available = np.ones(candidates.size, dtype=bool)
+    selected = []
+    for step in range(min(top_k, candidates.size)):
+        if step == 0:
+            mmr_scores = rel.copy()
+        else:
+            mmr_scores = lambda_param * rel - (1 - lambda_param) * max_sim
+        mmr_scores[~available] = -np.inf
+        idx = int(np.argmax(mmr_scores))
+        selected.append(int(candidates[idx]))
+        available[idx] = False
+        np.maximum(max_sim, sub @ sub[idx], out=max_sim)
+    return selected
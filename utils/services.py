@@ -0,0 +1,85 @@
+import threading
+from typing import Optional
+
+
+class ServiceRegistry:
+    """Owns the long-lived clients shared by every request in a worker process.
+
+    Each service is built on first use and then reused, so Gemini clients and
+    the MongoDB connection pool are set up once per worker rather than once per
+    request. Pass instances to the constructor to inject fakes in tests.
+    """
+
+    def __init__(self, embedder=None, rag_engine=None, embedding_store=None, manifest=None, chat_history=None):
+        self._services = {
+            "embedder": embedder,
+            "rag_engine": rag_engine,
+            "embedding_store": embedding_store,
+            "manifest": manifest,
+            "chat_history": chat_history,
+        }
+        self._lock = threading.Lock()
+
+    def _get(self, name: str, factory):
+        service = self._services[name]
+        if service is None:
+            with self._lock:
+                service = self._services[name]
+                if service is None:
+                    service = factory()
+                    self._services[name] = service
+        return service
+
+    @property
+    def embedder(self):
+        from utils.embedding_generator import EmbeddingGenerator
+        # Backend (Gemini or local) and model come from utils/config.py
+        return self._get("embedder", EmbeddingGenerator)
+
+    @property
+    def rag_engine(self):
+        from utils.config import GEMINI_API_KEY, GEMINI_MODEL_NAME
+        from utils.rag_engine import RAGEngine
+        return self._get("rag_engine", lambda: RAGEngine(GEMINI_API_KEY, GEMINI_MODEL_NAME))
+
+    @property
+    def embedding_store(self):
+        from utils.mongo_embedding_store import MongoEmbeddingStore
+        return self._get("embedding_store", MongoEmbeddingStore)
+
+    @property
+    def manifest(self):
+        from utils.ingestion_manifest import IngestionManifest
+        return self._get("manifest", IngestionManifest)
+
+    @property
+    def chat_history(self):
+        from utils.chat_history import ChatHistory, create_chat_history_store
+        from utils.query_pipeline import get_query_pool
+        # Summaries are generated lazily so a registry with a fake engine summarizes with it
+        return self._get("chat_history", lambda: ChatHistory(
+            create_chat_history_store(),
+            lambda summary, turns: self.rag_engine.summarize_history(summary, turns),
+            executor=get_query_pool(),
+        ))
+
+
+_registry: Optional[ServiceRegistry] = None
+_registry_lock = threading.Lock()
+
+
+def get_services() -> ServiceRegistry:
+    """Returns this worker's registry, creating it on first use."""
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = ServiceRegistry()
+    return _registry
+
+
+def set_services(registry: Optional[ServiceRegistry]):
+    """Replaces the worker's registry (e.g. with fakes in tests); None resets it."""
+    global _registry
+    with _registry_lock:
+        _registry = registry
@@ -1,9 +1,18 @@
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Iterable, Iterator
 import math
 import re
-from utils.config import EMBEDDING_MODEL_NAME
 from .embedding_generator import EmbeddingGenerator
 
+# Paragraph boundary used by _recursive_split and iter_chunks
+_PARAGRAPH = re.compile(r"\n\s*\n")
+
+# Separators _recursive_split tries, largest first: (split function, joiner)
+_SPLIT_LEVELS = (
+    (_PARAGRAPH.split, "\n\n"),
+    (lambda text: text.split("\n"), "\n"),
+    (re.compile(r"(?<=[.!?])\s+").split, " "),
+)
+
 
 def _cosine_similarity(a: List[float], b: List[float]) -> float:
     denom_a = math.sqrt(sum(x * x for x in a))
@@ -31,77 +40,57 @@ class TextChunker:
         self.chunk_size = chunk_size
         self.chunk_overlap = chunk_overlap
         self.similarity_threshold = similarity_threshold
-        self.embedder = embedder or EmbeddingGenerator(EMBEDDING_MODEL_NAME)
+        self._embedder = embedder
 
+    @property
+    def embedder(self) -> EmbeddingGenerator:
+        # Created lazily: the recursive splitter never needs it, and chunkers
+        # built in extraction worker processes should not open API clients.
+        if self._embedder is None:
+            self._embedder = EmbeddingGenerator()
+        return self._embedder
 
-    def _recursive_split(self, text: str, max_size: int) -> List[str]:
+
+    def _recursive_split(self, text: str, max_size: int, level: int = 0) -> List[str]:
         """
         Recursively split text by big to small separators until all chunks are <= max_size.
         Order: paragraphs (\n\n), lines (\n), sentences, spaces.
+        A piece that is still too large on its own has no separators of its
+        level or above, so it is split from the next level down rather than
+        re-scanned from paragraphs.
         """
         if len(text) <= max_size:
             return [text]
-        # Try paragraphs
-        paras = [p.strip() for p in re.split(r"\n\s*\n", text) if p.strip()]
-        if len(paras) > 1:
-            chunks = []
-            buf = ""
-            for para in paras:
-                if len(buf) + len(para) + 2 <= max_size:
-                    buf = buf + ("\n\n" if buf else "") + para
-                else:
-                    if buf:
-                        chunks.extend(self._recursive_split(buf, max_size))
-                    buf = para
-            if buf:
-                chunks.extend(self._recursive_split(buf, max_size))
-            return chunks
-        # Try lines
-        lines = [l.strip() for l in text.split("\n") if l.strip()]
-        if len(lines) > 1:
-            chunks = []
-            buf = ""
-            for line in lines:
-                if len(buf) + len(line) + 1 <= max_size:
-                    buf = buf + ("\n" if buf else "") + line
-                else:
-                    if buf:
-                        chunks.extend(self._recursive_split(buf, max_size))
-                    buf = line
-            if buf:
-                chunks.extend(self._recursive_split(buf, max_size))
-            return chunks
-        # Try sentences
-        sents = [s.strip() for s in re.split(r'(?<=[.!?])\s+', text) if s.strip()]
-        if len(sents) > 1:
-            chunks = []
-            buf = ""
-            for sent in sents:
-                if len(buf) + len(sent) + 1 <= max_size:
-                    buf = buf + (" " if buf else "") + sent
-                else:
-                    if buf:
-                        chunks.extend(self._recursive_split(buf, max_size))
-                    buf = sent
-            if buf:
-                chunks.extend(self._recursive_split(buf, max_size))
-            return chunks
-        # Finally, split by spaces if still too large
-        if len(text) > max_size:
-            words = text.split()
-            chunks = []
-            buf = ""
-            for word in words:
-                if len(buf) + len(word) + 1 <= max_size:
-                    buf = buf + (" " if buf else "") + word
-                else:
-                    if buf:
-                        chunks.append(buf)
-                    buf = word
-            if buf:
-                chunks.append(buf)
-            return chunks
-        return [text]
+        for depth in range(level, len(_SPLIT_LEVELS)):
+            split, joiner = _SPLIT_LEVELS[depth]
+            pieces = [p for p in map(str.strip, split(text)) if p]
+            if len(pieces) > 1:
+                return self._pack(pieces, joiner, depth + 1, max_size)
+        # Finally, split by spaces; an oversized word stays whole
+        return self._pack(text.split(), " ", None, max_size)
+
+    def _pack(self, pieces: List[str], joiner: str, next_level: Optional[int], max_size: int) -> List[str]:
+        """Greedily joins pieces into chunks of at most max_size characters."""
+        chunks = []
+        group, group_len = [], 0
+
+        def flush():
+            if len(group) > 1 or next_level is None:
+                chunks.append(joiner.join(group))
+            else:
+                chunks.extend(self._recursive_split(group[0], max_size, next_level))
+
+        for piece in pieces:
+            if group_len + len(piece) + len(joiner) <= max_size:
+                group_len += len(piece) + (len(joiner) if group else 0)
+                group.append(piece)
+                continue
+            if group:
+                flush()
+            group, group_len = [piece], len(piece)
+        if group:
+            flush()
+        return chunks
 
     def create_chunks(self, document: Dict) -> List[Dict]:
         text = document["text"]
@@ -125,4 +114,54 @@ class TextChunker:
                 prev_tail = tail
             else:
                 prev_tail = ""
-        return chunks
\ No newline at end of file
+        return chunks
+
+    def iter_chunks(self, segments: Iterable[Dict], source: str) -> Iterator[Dict]:
+        """
+        Streaming counterpart of create_chunks over located segments (see
+        DocumentProcessor.iter_segments). Segments are cut into paragraphs and
+        packed greedily exactly like _recursive_split packs paragraphs, so the
+        chunks match create_chunks on the joined text while memory stays
+        bounded by one chunk plus the largest paragraph. Each chunk's metadata
+        carries the location of the paragraphs it contains, e.g. {"page": 3}
+        or {"page": 3, "page_end": 4}.
+        """
+        chunk_id = 0
+        prev_tail = ""
+        buf, buf_locations = "", []
+
+        def emit(text, locations):
+            nonlocal chunk_id, prev_tail
+            metadata = {"source": source}
+            if locations:
+                for key, first in locations[0].items():
+                    metadata[key] = first
+                    last = locations[-1].get(key, first)
+                    if last != first:
+                        metadata[f"{key}_end"] = last
+            for chunk_text in self._recursive_split(text, self.chunk_size):
+                if self.chunk_overlap > 0 and prev_tail:
+                    chunk_text = prev_tail + "\n\n" + chunk_text
+                yield {
+                    "id": f"{source}_chunk_{chunk_id}",
+                    "text": chunk_text,
+                    "metadata": dict(metadata),
+                }
+                chunk_id += 1
+                prev_tail = chunk_text[-self.chunk_overlap:] if self.chunk_overlap > 0 else ""
+
+        for segment in segments:
+            location = segment.get("location", {})
+            for para in _PARAGRAPH.split(segment["text"]):
+                para = para.strip()
+                if not para:
+                    continue
+                if len(buf) + len(para) + 2 <= self.chunk_size:
+                    buf = buf + ("\n\n" if buf else "") + para
+                    buf_locations.append(location)
+                    continue
+                if buf:
+                    yield from emit(buf, buf_locations)
+                buf, buf_locations = para, [location]
+        if buf:
+            yield from emit(buf, buf_locations)
@@ -1,21 +1,32 @@
 from flask import Blueprint, jsonify, session
-from utils.mongo_embedding_store import MongoEmbeddingStore
+from utils.services import get_services
+from utils.blob_store import get_blob_store
 
 bp = Blueprint('user_files', __name__)
 
 @bp.route('/user_files', methods=['GET'])
 def user_files():
     user_id = session.get('user_id', 'anonymous')
-    mongo_store = MongoEmbeddingStore()
-    files = mongo_store.collection.distinct('doc_id', {'user_id': user_id})
+    # One manifest record per document: no scan of the chunk collection
+    documents = get_services().manifest.list_documents(user_id)
     file_info = []
     import os
-    uploads_folder = os.path.join(os.getcwd(), 'uploads')
+    blob_store = get_blob_store()
     session_files = session.get('session_files', set())
-    for fname in files:
-        path = os.path.join(uploads_folder, fname)
-        size = os.path.getsize(path) if os.path.exists(path) else None
-        
+    for doc in documents:
+        fname = doc['doc_id']
+        size = doc.get('size_bytes')
+        if size is None:
+            # Entries backfilled without a size
+            path = blob_store.user_path(user_id, fname)
+            size = os.path.getsize(path) if path else None
+
         previous = fname not in session_files
-        file_info.append({'name': fname, 'size': size, 'previous': previous})
+        file_info.append({
+            'name': fname,
+            'size': size,
+            'previous': previous,
+            'chunks': doc.get('chunk_count'),
+            'indexed_at': doc['indexed_at'].isoformat() if doc.get('indexed_at') else None,
+        })
     return jsonify({'files': file_info})
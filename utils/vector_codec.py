@@ -0,0 +1,39 @@
+import numpy as np
+from typing import Dict, Sequence
+from bson.binary import Binary
+
+# Storage formats for the "embedding" field of a chunk document:
+#   list    - BSON array of doubles (the original format)
+#   float32 - packed little-endian float32 bytes
+#   int8    - scalar-quantized int8 bytes plus a per-vector "embedding_scale"
+FORMATS = ("list", "float32", "int8")
+
+
+def encode_embedding(vector: Sequence[float], fmt: str) -> Dict:
+    """Returns the document fields that store `vector` in the given format."""
+    if fmt == "list":
+        return {"embedding": [float(x) for x in vector], "embedding_format": "list"}
+    vec = np.asarray(vector, dtype="<f4")
+    if fmt == "float32":
+        return {"embedding": Binary(vec.tobytes()), "embedding_format": "float32"}
+    if fmt == "int8":
+        peak = float(np.max(np.abs(vec))) if vec.size else 0.0
+        scale = peak / 127.0 if peak else 1.0
+        quantized = np.clip(np.rint(vec / scale), -127, 127).astype(np.int8)
+        return {"embedding": Binary(quantized.tobytes()), "embedding_format": "int8", "embedding_scale": scale}
+    raise ValueError(f"Unknown embedding format: {fmt}")
+
+
+def decode_embedding(doc: Dict) -> np.ndarray:
+    """
+    Decodes a chunk document's embedding to a float32 vector. float32 blobs are
+    viewed in place without copying; documents without `embedding_format` are
+    treated as the original list format.
+    """
+    raw = doc["embedding"]
+    fmt = doc.get("embedding_format", "list")
+    if fmt == "float32":
+        return np.frombuffer(raw, dtype="<f4")
+    if fmt == "int8":
+        return np.frombuffer(raw, dtype=np.int8).astype(np.float32) * np.float32(doc.get("embedding_scale", 1.0))
+    return np.asarray(raw, dtype=np.float32)